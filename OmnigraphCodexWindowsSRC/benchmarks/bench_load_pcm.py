@@ -0,0 +1,73 @@
+"""
+Per-file latency of the in-process WAV reader against the ffmpeg pipe.
+
+    python benchmarks/bench_load_pcm.py [--repeat N]
+
+Short clips dominate nightly batches, so the table covers 0.5 s to 60 s of
+44.1 kHz mono and 48 kHz stereo WAV.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from omnigraph import pcm  # noqa: E402
+
+DURATIONS = (0.5, 2, 10, 60)
+LAYOUTS = ((1, 44100), (2, 48000))
+
+
+def write_clip(path, seconds, channels, sample_rate):
+    rng = np.random.default_rng(0)
+    frames = rng.integers(-20000, 20000, int(seconds * sample_rate) * channels, dtype=np.int16)
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(frames.tobytes())
+
+
+def median_ms(loader, path, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loader(path)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    have_ffmpeg = shutil.which("ffmpeg") is not None
+    if not have_ffmpeg:
+        print("ffmpeg not found on PATH; only the native path is timed.\n")
+
+    print(f"{'clip':>18} | {'native ms':>10} | {'ffmpeg ms':>10} | {'speed-up':>8}")
+    print("-" * 56)
+    with tempfile.TemporaryDirectory() as workdir:
+        for channels, sample_rate in LAYOUTS:
+            for seconds in DURATIONS:
+                path = os.path.join(workdir, f"clip_{channels}_{sample_rate}_{seconds}.wav")
+                write_clip(path, seconds, channels, sample_rate)
+                native = median_ms(pcm.load_pcm_native, path, args.repeat)
+                label = f"{seconds:g}s {channels}ch {sample_rate // 1000}k"
+                if have_ffmpeg:
+                    ffmpeg = median_ms(pcm.load_pcm_ffmpeg, path, args.repeat)
+                    print(f"{label:>18} | {native:10.2f} | {ffmpeg:10.2f} | {ffmpeg / native:7.1f}x")
+                else:
+                    print(f"{label:>18} | {native:10.2f} | {'-':>10} | {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
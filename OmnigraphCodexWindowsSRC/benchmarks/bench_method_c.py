@@ -0,0 +1,68 @@
+"""
+Method C encode time: the original band split (three spectrum copies and three
+full irffts at the signal's own length) against codec.encode, for a smooth
+length and for the next prime length.
+
+    python benchmarks/bench_method_c.py [--seconds S]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from omnigraph import codec, spectral  # noqa: E402
+
+
+def original_bands(pcm):
+    audio_float = pcm.astype(np.float32) / 32768.0
+    N = len(audio_float)
+    fft_data = np.fft.rfft(audio_float)
+    k_low = int(codec.LOW_CUTOFF * N / codec.SAMPLE_RATE)
+    k_mid = int(codec.MID_CUTOFF * N / codec.SAMPLE_RATE)
+    bands = []
+    for lo, hi in ((0, k_low), (k_low, k_mid), (k_mid, len(fft_data))):
+        band_fft = fft_data.copy()
+        band_fft[:lo] = 0.0
+        band_fft[hi:] = 0.0
+        bands.append(codec.band_to_uint8(np.fft.irfft(band_fft, n=N)))
+    return bands
+
+
+def next_prime(count):
+    def is_prime(value):
+        return value > 1 and all(value % p for p in range(2, int(value ** 0.5) + 1))
+    while not is_prime(count):
+        count += 1
+    return count
+
+
+def seconds_for(function, pcm):
+    start = time.perf_counter()
+    function(pcm)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=600, help="clip length at 44.1 kHz")
+    args = parser.parse_args()
+
+    fft = spectral.backend()
+    print(f"backend {fft.__name__}, {spectral.FFT_WORKERS} worker(s)\n")
+    print(f"{'samples':>12} | {'original s':>10} | {'encode s':>8} | {'speed-up':>8}")
+    print("-" * 49)
+    rng = np.random.default_rng(0)
+    smooth = int(args.seconds * codec.SAMPLE_RATE)
+    for count in (smooth, next_prime(smooth)):
+        pcm = rng.integers(-20000, 20000, count, dtype=np.int16)
+        before = seconds_for(original_bands, pcm)
+        after = seconds_for(lambda data: codec.encode(data, "C"), pcm)
+        print(f"{count:>12,} | {before:10.2f} | {after:8.2f} | {before / after:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
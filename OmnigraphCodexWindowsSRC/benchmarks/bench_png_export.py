@@ -0,0 +1,70 @@
+"""
+PNG size against encode time across zlib levels and strategies for typical
+Method A/B/C images.
+
+    python benchmarks/bench_png_export.py [--seconds 30] [--strategies default,rle]
+
+Methods A/B store raw quantized samples (close to noise), while Method C's
+band-split planes are much smoother, so the best level differs per method.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from omnigraph import codec, images  # noqa: E402
+
+
+def synthetic_music(seconds, seed=0):
+    """ A few decaying tones over a noise bed: closer to real material than white noise. """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * codec.SAMPLE_RATE)) / codec.SAMPLE_RATE
+    signal = 0.05 * rng.standard_normal(len(t))
+    for freq in (110.0, 220.0, 440.0, 1320.0, 5200.0):
+        envelope = np.exp(-3 * (t % 0.5))
+        signal += 0.15 * envelope * np.sin(2 * np.pi * freq * t)
+    return (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+
+
+def time_png(rgb_array, settings):
+    buffer = io.BytesIO()
+    start = time.perf_counter()
+    images.save_png(rgb_array, buffer, settings)
+    return time.perf_counter() - start, buffer.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--levels", default="0,1,3,6,9")
+    parser.add_argument("--strategies", default="default,filtered,rle,huffman")
+    parser.add_argument("--optimize", action="store_true", help="also time optimize=True at level 9")
+    args = parser.parse_args()
+
+    pcm = synthetic_music(args.seconds)
+    levels = [int(level) for level in args.levels.split(",")]
+    strategies = args.strategies.split(",")
+
+    print(f"{'method':>6} | {'strategy':>8} | {'level':>5} | {'size MB':>8} | {'ratio':>6} | {'ms':>8}")
+    print("-" * 58)
+    for method in codec.METHODS:
+        rgb_array = codec.encode(pcm, method)
+        raw_size = rgb_array.nbytes
+        runs = [(strategy, level, False) for strategy in strategies for level in levels]
+        if args.optimize:
+            runs.append(("default", 9, True))
+        for strategy, level, optimize in runs:
+            seconds, size = time_png(rgb_array, images.PngSettings(level, strategy, optimize))
+            label = f"{level}{'+opt' if optimize else ''}"
+            print(f"{method:>6} | {strategy:>8} | {label:>5} | {size / 1e6:8.2f} | "
+                  f"{size / raw_size:6.2f} | {seconds * 1000:8.1f}")
+        print("-" * 58)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Throughput and peak temporary memory of the sample quantizers: the original
+float32 round-trip formulas against the lookup-table kernels in omnigraph.codec.
+
+    python benchmarks/bench_quantize.py [--seconds S] [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from omnigraph import codec  # noqa: E402
+
+
+def float_int16_to_uint8(pcm):
+    return ((pcm.astype(np.float32) + 32768) / 65535 * 255).astype(np.uint8)
+
+
+def float_uint8_to_int16(values):
+    return ((values.astype(np.float32) / 255) * 65535 - 32768).astype(np.int16)
+
+
+def measure(convert, data, repeat):
+    """ Returns (median Msamples/s, peak bytes allocated during one call). """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        convert(data)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    convert(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(data) / statistics.median(timings) / 1e6, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=600, help="length of the test signal at 44.1 kHz")
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pcm = rng.integers(-32768, 32768, int(args.seconds * codec.SAMPLE_RATE), dtype=np.int16)
+    values = codec.int16_to_uint8(pcm)
+    assert np.array_equal(values, float_int16_to_uint8(pcm))
+    assert np.array_equal(codec.uint8_to_int16(values), float_uint8_to_int16(values))
+    out = np.empty_like(values)
+
+    cases = (
+        ("int16->uint8 float", float_int16_to_uint8, pcm),
+        ("int16->uint8 lut", codec.int16_to_uint8, pcm),
+        ("int16->uint8 lut, out=", lambda data: codec.int16_to_uint8(data, out=out), pcm),
+        ("uint8->int16 float", float_uint8_to_int16, values),
+        ("uint8->int16 lut", codec.uint8_to_int16, values),
+    )
+    print(f"{len(pcm):,} samples\n")
+    print(f"{'kernel':>24} | {'Msamples/s':>10} | {'peak MB':>8}")
+    print("-" * 48)
+    for label, convert, data in cases:
+        rate, peak = measure(convert, data, args.repeat)
+        print(f"{label:>24} | {rate:10.1f} | {peak / 1e6:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
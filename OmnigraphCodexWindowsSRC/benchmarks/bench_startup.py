@@ -0,0 +1,137 @@
+"""
+Cold-start timings for the GUI, as JSON that can be compared between releases.
+
+    python benchmarks/bench_startup.py [--repeat N] [-o startup.json] [--compare old.json]
+
+Each run starts a fresh interpreter that imports omnigraph_codex, builds the
+main window and waits for its first paint event, then reports:
+  - process: interpreter launch to first paint, as seen from this script
+  - import: `import omnigraph_codex`
+  - window: AudioToImageConverter() (UI setup, no audio device)
+  - first_paint: import start to the window's first paint
+and which heavy modules (NumPy, PIL, PyAudio, the codec) had really been loaded
+by then; all of them should be "no". Runs offscreen unless QT_QPA_PLATFORM is set.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ("process", "import", "window", "first_paint")
+HEAVY_MODULES = ("numpy", "PIL.Image", "pyaudio", "omnigraph.codec")
+PAINT_TIMEOUT_MS = 10000
+
+
+def measure_in_process():
+    """ Child side: one cold start, printed as a JSON line. """
+    start = time.perf_counter()
+    sys.path.insert(0, APP_DIR)
+    import omnigraph_codex
+    imported = time.perf_counter()
+
+    from PyQt5.QtCore import QEvent, QObject, QTimer
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication(sys.argv[:1])
+    window = omnigraph_codex.AudioToImageConverter()
+    built = time.perf_counter()
+    painted = []
+
+    class FirstPaint(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Paint and not painted:
+                painted.append(time.perf_counter())
+                QTimer.singleShot(0, app.quit)
+            return False
+
+    watcher = FirstPaint()
+    window.installEventFilter(watcher)
+    window.show()
+    QTimer.singleShot(PAINT_TIMEOUT_MS, app.quit)
+    app.exec_()
+    if not painted:
+        raise SystemExit("The window was never painted.")
+
+    # LazyLoader modules sit in sys.modules before they run; only count executed ones
+    loaded = [name for name in HEAVY_MODULES
+              if name in sys.modules and type(sys.modules[name]).__name__ != "_LazyModule"]
+    print(json.dumps({"import": imported - start, "window": built - imported,
+                      "first_paint": painted[0] - start, "loaded": loaded}))
+
+
+def run_once():
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"],
+                               capture_output=True, text=True, env=env, cwd=APP_DIR)
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise SystemExit(completed.stderr.strip() or f"child exited with {completed.returncode}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process"] = elapsed
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=APP_DIR).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "qt_platform": os.environ.get("QT_QPA_PLATFORM", "offscreen")}
+
+
+def compare(results, baseline_path, output=sys.stdout):
+    with open(baseline_path) as handle:
+        baseline = {row["stage"]: row for row in json.load(handle)["results"]}
+    print(f"\n{'stage':>12} | {'before ms':>10} | {'after ms':>10} | {'ratio':>6}", file=output)
+    print("-" * 48, file=output)
+    for row in results:
+        old = baseline.get(row["stage"])
+        if old is None:
+            continue
+        print(f"{row['stage']:>12} | {old['seconds'] * 1000:10.2f} | {row['seconds'] * 1000:10.2f} | "
+              f"{row['seconds'] / old['seconds']:5.2f}x", file=output)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="cold starts to take the median of")
+    parser.add_argument("-o", "--output", help="write JSON results here")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON from an earlier run to compare against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        measure_in_process()
+        return
+
+    runs = [run_once() for _ in range(max(1, args.repeat))]
+    results = [{"stage": stage, "seconds": statistics.median(run[stage] for run in runs),
+                "min_seconds": min(run[stage] for run in runs), "repeat": len(runs)}
+               for stage in STAGES]
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+
+    print(f"{'stage':>12} | {'ms':>10} | {'min ms':>10}")
+    print("-" * 38)
+    for row in results:
+        print(f"{row['stage']:>12} | {row['seconds'] * 1000:10.2f} | {row['min_seconds'] * 1000:10.2f}")
+    for name in HEAVY_MODULES:
+        print(f"{name:>16} loaded before first paint: {'yes' if name in loaded else 'no'}")
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump({"environment": environment(), "results": results, "loaded": loaded}, handle, indent=1)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
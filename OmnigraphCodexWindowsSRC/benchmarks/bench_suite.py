@@ -0,0 +1,184 @@
+"""
+Stage timings for the codec hot paths, as JSON that can be compared between
+commits. Needs neither Qt nor an audio device.
+
+    python benchmarks/bench_suite.py [--durations 1s,1m,10m,1h] [--methods ABC]
+                                     [--repeat N] [-o results.json] [--compare old.json]
+
+For every duration of synthetic PCM this times, each in a fresh process so the
+peak RSS belongs to that case alone:
+  - io: WAV read (native and through ffmpeg), quantize, playback callbacks
+  - A/B/C: band split (C only), encode, PNG save, PNG load, decode
+Peak RSS is the process high-water mark after each stage. An hour of Method C
+needs several GB of RAM.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from omnigraph import codec, images, pcm, playback, spectral  # noqa: E402
+
+DURATIONS = {"1s": 1, "1m": 60, "10m": 600, "1h": 3600}
+GENERATE_BLOCK = 1 << 20
+
+
+def synthetic_pcm(seconds, seed=0):
+    """ Decaying tones over a noise bed, generated in blocks to keep 1 h cheap. """
+    rng = np.random.default_rng(seed)
+    count = int(seconds * codec.SAMPLE_RATE)
+    out = np.empty(count, dtype=np.int16)
+    for start in range(0, count, GENERATE_BLOCK):
+        t = np.arange(start, min(start + GENERATE_BLOCK, count)) / codec.SAMPLE_RATE
+        signal = 0.05 * rng.standard_normal(len(t))
+        for freq in (110.0, 220.0, 440.0, 1320.0, 5200.0):
+            signal += 0.15 * np.exp(-3 * (t % 0.5)) * np.sin(2 * np.pi * freq * t)
+        out[start:start + len(t)] = np.clip(signal, -1, 1) * 32767
+    return out
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1e6
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+class Recorder:
+    def __init__(self, duration, method, samples, repeat):
+        self.duration, self.method, self.samples, self.repeat = duration, method, samples, repeat
+        self.results = []
+
+    def time(self, stage, function, *args):
+        """ Runs `function(*args)` `repeat` times; returns the last result. """
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = function(*args)
+            timings.append(time.perf_counter() - start)
+        self.results.append({
+            "duration": self.duration, "method": self.method, "stage": stage,
+            "samples": self.samples, "seconds": statistics.median(timings),
+            "min_seconds": min(timings), "repeat": self.repeat, "peak_rss_mb": peak_rss_mb(),
+        })
+        return result
+
+
+def play_through(pcm_16bit):
+    source = playback.PlaybackSource(pcm_16bit)
+    callback = source.callback
+    while not source.finished:
+        callback(None, playback.FRAMES_PER_BUFFER, None, 0)
+
+
+def run_case(label, method, repeat):
+    """ One duration and one method (or "io") in this process; returns result rows. """
+    audio = synthetic_pcm(DURATIONS[label])
+    recorder = Recorder(label, method, len(audio), repeat)
+    with tempfile.TemporaryDirectory() as workdir:
+        if method == "io":
+            wav_path = os.path.join(workdir, "clip.wav")
+            pcm.write_wav(wav_path, audio)
+            recorder.time("wav_read", pcm.load_pcm_native, wav_path)
+            if shutil.which("ffmpeg"):
+                recorder.time("ffmpeg_decode", pcm.load_pcm_ffmpeg, wav_path)
+            recorder.time("quantize", codec.int16_to_uint8, audio)
+            recorder.time("playback_callbacks", play_through, audio)
+            return recorder.results
+
+        if method == "C":
+            recorder.time("band_split", spectral.split_bands, audio.astype(np.float32) / 32768.0,
+                          codec.SAMPLE_RATE, (codec.LOW_CUTOFF, codec.MID_CUTOFF))
+        rgb_array = recorder.time("encode", codec.encode, audio, method)
+        png_path = os.path.join(workdir, "image.png")
+        info = codec.ImageInfo(method, len(audio))
+        recorder.time("png_save", images.save_png, rgb_array, png_path, images.DEFAULT_PNG, info)
+        loaded = recorder.time("png_load", images.load_rgb, png_path)
+        recorder.time("decode", codec.decode, loaded, method, len(audio))
+    return recorder.results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count(),
+            "fft_backend": spectral.backend().__name__, "fft_workers": spectral.FFT_WORKERS}
+
+
+def compare(results, baseline_path, output=sys.stdout):
+    with open(baseline_path) as handle:
+        baseline = {(row["duration"], row["method"], row["stage"]): row
+                    for row in json.load(handle)["results"]}
+    print(f"\n{'case':>28} | {'before ms':>10} | {'after ms':>10} | {'ratio':>6}", file=output)
+    print("-" * 64, file=output)
+    for row in results:
+        old = baseline.get((row["duration"], row["method"], row["stage"]))
+        if old is None:
+            continue
+        case = f"{row['duration']} {row['method']} {row['stage']}"
+        print(f"{case:>28} | {old['seconds'] * 1000:10.2f} | {row['seconds'] * 1000:10.2f} | "
+              f"{row['seconds'] / old['seconds']:5.2f}x", file=output)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--durations", default=",".join(DURATIONS),
+                        help="comma-separated subset of " + ", ".join(DURATIONS))
+    parser.add_argument("--methods", default="ABC", type=str.upper)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage below 10 min (1 above)")
+    parser.add_argument("-o", "--output", help="write JSON results here")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    labels = [label.strip() for label in args.durations.split(",")]
+    unknown = [label for label in labels if label not in DURATIONS]
+    if unknown:
+        parser.error(f"unknown durations: {', '.join(unknown)}")
+    methods = ["io"] + [codec.normalize_method(method) for method in args.methods]
+
+    results = []
+    print(f"{'case':>28} | {'ms':>10} | {'peak RSS MB':>11}")
+    print("-" * 55)
+    for label in labels:
+        repeat = args.repeat if DURATIONS[label] < 600 else 1
+        for method in methods:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                rows = pool.submit(run_case, label, method, repeat).result()
+            for row in rows:
+                rss = "-" if row["peak_rss_mb"] is None else f"{row['peak_rss_mb']:.0f}"
+                case = f"{label} {method} {row['stage']}"
+                print(f"{case:>28} | {row['seconds'] * 1000:10.2f} | {rss:>11}")
+            results.extend(rows)
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump({"environment": environment(), "results": results}, handle, indent=1)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+GUI-free Omnigraph Codex core. Importing this package loads nothing beyond the
+standard library; NumPy comes in with the first codec name used.
+"""
+__all__ = [
+    "SAMPLE_RATE", "METHODS", "CodecError", "ImageInfo", "normalize_method", "encode", "decode",
+]
+
+
+def __getattr__(name):
+    # Re-exports resolve on first use so `omnigraph.profiling` & co. start cheaply
+    if name in __all__:
+        from . import codec
+        return getattr(codec, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,81 @@
+"""
+In-memory LRU cache of codec results, bounded by a byte budget.
+
+Entries are keyed by the source file identity (absolute path, mtime, size), so
+an edited file is never served stale. Jobs store the normalized PCM once per
+source and the image and playback PCM once per method, which makes switching
+between Methods A, B and C on a loaded file a lookup instead of a re-encode.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Override with OMNIGRAPH_CACHE_MB; 0 disables caching
+DEFAULT_BUDGET = int(os.environ.get("OMNIGRAPH_CACHE_MB", "512")) * 1024 * 1024
+
+
+def source_key(path):
+    """ Identity of a file on disk: changes whenever the file is rewritten. """
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _nbytes(value):
+    if isinstance(value, np.memmap):
+        return 0  # Backed by the file, not by RAM
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(item) for item in value)
+    return 0
+
+
+class ResultCache:
+    """ Thread-safe LRU map whose total array size stays within `budget_bytes`. """
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """ Stores `value`; anything larger than the whole budget is not kept. """
+        size = _nbytes(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            if size > self.budget_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.budget_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size_bytes(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
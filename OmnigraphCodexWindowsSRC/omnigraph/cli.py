@@ -0,0 +1,268 @@
+"""
+Batch command line for the codec:
+
+    omnigraph-codex encode [-m A|B|C] [-j WORKERS] [-o OUT_DIR] [-f png|raw] [--stream] INPUT...
+    omnigraph-codex decode [-m A|B|C] [-j WORKERS] [-o OUT_DIR] [--max-duration S | --duration S] INPUT...
+    omnigraph-codex serve [--host HOST] [--port PORT] [--unix PATH] [-j WORKERS] [--max-queue N]
+                          [--output-root DIR]
+
+All three take --profile LOG to append per-stage timings as JSON lines (see
+omnigraph.profiling).
+
+Encoded images record their method and sample count, so decode only uses -m
+for images written by older versions. Any other picture can be decoded too;
+--max-duration caps the audio a large photo turns into (it is shrunk while
+being read and resampled), and --duration sets the length exactly.
+
+Inputs may be files, directories or glob patterns. Every file is an independent
+job, so jobs are spread across a process pool.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import codec, images, jobs, pcm, profiling, rawimage, spectral, stream
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.ogg', '.flac')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', rawimage.RAW_EXTENSION)
+
+
+def expand_inputs(patterns, extensions, recursive=False):
+    """ Resolves files, directories and globs into a sorted, de-duplicated list of files. """
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            walker = os.walk(pattern) if recursive else [next(os.walk(pattern))]
+            for root, _, names in walker:
+                found.extend(os.path.join(root, name) for name in names
+                             if name.lower().endswith(extensions))
+        elif os.path.isfile(pattern):
+            found.append(pattern)
+        else:
+            found.extend(path for path in glob.glob(pattern, recursive=recursive)
+                         if os.path.isfile(path) and path.lower().endswith(extensions))
+    seen = set()
+    unique = []
+    for path in found:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return sorted(unique)
+
+
+def output_path(input_path, out_dir, suffix):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(out_dir or os.path.dirname(input_path), stem + suffix)
+
+
+def plan_outputs(files, out_dir, suffix):
+    """
+    Pairs each input with its output path, before anything runs. Inputs whose
+    outputs would land on the same file (p.jpg and p.png, or same-named files
+    from different directories with -o) are returned separately, since writing
+    either would silently replace the other.
+    """
+    by_target = {}
+    for path in files:
+        target = output_path(path, out_dir, suffix)
+        by_target.setdefault(os.path.normcase(os.path.abspath(target)), []).append((path, target))
+    planned, colliding = [], []
+    for pairs in by_target.values():
+        (planned if len(pairs) == 1 else colliding).extend(pairs)
+    return planned, colliding
+
+
+def init_worker(fft_workers, profile_settings):
+    spectral.set_workers(fft_workers)
+    log_path, memory = profile_settings
+    if log_path is not None:
+        profiling.enable(log_path, memory)
+
+
+def worker_pool(workers):
+    """
+    A process pool for encode/decode jobs, with the FFT threads shared out so
+    the workers together use the cores once and profiling set up in each.
+    """
+    # Share the cores between processes rather than threading each FFT across all of them
+    fft_workers = max(1, spectral.FFT_WORKERS // workers)
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                               initargs=(fft_workers, profiling.settings()))
+
+
+def encode_job(audio_path, image_path, method, streaming=False, png_settings=images.DEFAULT_PNG):
+    start = time.perf_counter()
+    raw = rawimage.is_raw_path(image_path)
+    if streaming and raw:
+        stream.encode_file_to_raw(audio_path, image_path, method)
+    elif streaming:
+        stream.encode_file_to_png(audio_path, image_path, method, png_settings=png_settings)
+    else:
+        audio_data = pcm.load_pcm(audio_path)
+        rgb_array = codec.encode(audio_data, method)
+        if raw:
+            rawimage.save_raw(image_path, rgb_array, method, len(audio_data))
+        else:
+            images.save_png(rgb_array, image_path, png_settings,
+                            info=codec.ImageInfo(method, len(audio_data)))
+    return os.path.getsize(audio_path), time.perf_counter() - start
+
+
+def decode_job(image_path, audio_path, method, max_samples=None, stretch=False):
+    """
+    `method`, `max_samples` and `stretch` only apply to images without Omnigraph
+    metadata; see jobs.sonify_blocks.
+    """
+    start = time.perf_counter()
+    raw = rawimage.is_raw_path(image_path)
+    info = None if raw else images.read_info(image_path)
+    if max_samples and not raw and info is None and (
+            stretch or codec.decoded_length(images.read_size(image_path), method) > max_samples):
+        _, blocks, _ = jobs.sonify_blocks(image_path, method, max_samples, stretch)
+        pcm.write_wav_blocks(audio_path, blocks)
+        return os.path.getsize(image_path), time.perf_counter() - start
+    if raw:
+        header, pixels = rawimage.open_raw(image_path)
+        info = rawimage.header_info(header)
+        audio_16bit = codec.decode(pixels, info.method, info.sample_count)
+        del pixels
+    else:
+        if info is not None:
+            method = info.method
+        audio_16bit = codec.decode(images.load_rgb(image_path), method,
+                                   info.sample_count if info is not None else None)
+    pcm.write_wav(audio_path, audio_16bit)
+    return os.path.getsize(image_path), time.perf_counter() - start
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="omnigraph-codex",
+        description="Convert audio to Omnigraph images and back without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("encode", "audio files -> PNG images"),
+                            ("decode", "images -> WAV files")):
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument("inputs", nargs="+", help="files, directories or glob patterns")
+        sub.add_argument("-m", "--method", default="A", type=str.upper, choices=codec.METHODS,
+                         help="encoding method (default: A); decode uses it only for images "
+                              "without Omnigraph metadata")
+        sub.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                         help="worker processes (default: all cores)")
+        sub.add_argument("-o", "--out-dir", help="output directory (default: next to each input)")
+        sub.add_argument("-r", "--recursive", action="store_true",
+                         help="descend into sub-directories and expand ** in globs")
+        sub.add_argument("--profile", metavar="LOG",
+                         help="append per-stage timings to LOG as JSON lines")
+        sub.add_argument("--profile-memory", action="store_true",
+                         help="also record each stage's tracemalloc peak (slower)")
+    duration = commands.choices["decode"].add_mutually_exclusive_group()
+    duration.add_argument(
+        "--max-duration", type=float, metavar="SECONDS",
+        help="shrink pictures without Omnigraph metadata that would decode to longer audio")
+    duration.add_argument(
+        "--duration", type=float, metavar="SECONDS",
+        help="resample pictures without Omnigraph metadata to exactly this long")
+    commands.choices["encode"].add_argument(
+        "--stream", action="store_true",
+        help="encode block by block with flat memory use (for very long recordings)")
+    commands.choices["encode"].add_argument(
+        "-f", "--format", choices=("png", "raw"), default="png",
+        help="png for sharing, raw for an uncompressed memory-mappable .omniraw (default: png)")
+    commands.choices["encode"].add_argument(
+        "--compress-level", type=int, choices=range(10), default=images.DEFAULT_PNG.compress_level,
+        metavar="0-9", help="PNG zlib level (default: %(default)s)")
+    commands.choices["encode"].add_argument(
+        "--strategy", choices=sorted(images.PNG_STRATEGIES), default=images.DEFAULT_PNG.strategy,
+        help="PNG zlib strategy (default: %(default)s)")
+    commands.choices["encode"].add_argument(
+        "--optimize", action="store_true", help="let PIL search for the smallest PNG (slow)")
+
+    serve = commands.add_parser("serve", help="run a local HTTP job server (see omnigraph.server)")
+    serve.add_argument("--host", default="127.0.0.1", help="address to bind (default: %(default)s)")
+    serve.add_argument("--port", type=int, default=8765, help="TCP port (default: %(default)s)")
+    serve.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    serve.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                       help="worker processes (default: all cores)")
+    serve.add_argument("--max-queue", type=int, default=16,
+                       help="jobs admitted at once before answering 503 (default: %(default)s)")
+    serve.add_argument("--output-root", metavar="DIR",
+                       help="directory that ?out= paths are resolved in (without it ?out= is refused)")
+    serve.add_argument("--profile", metavar="LOG", help="append per-stage timings to LOG as JSON lines")
+    serve.add_argument("--profile-memory", action="store_true",
+                       help="also record each stage's tracemalloc peak (slower)")
+    return parser
+
+
+def run_batch(command, inputs, method, workers, out_dir=None, recursive=False, streaming=False,
+              image_format="png", png_settings=images.DEFAULT_PNG, output=sys.stdout,
+              max_samples=None, stretch=False):
+    """ Runs a batch and returns the number of failed files. """
+    if command == "encode":
+        job, extensions = encode_job, AUDIO_EXTENSIONS
+        suffix = rawimage.RAW_EXTENSION if image_format == "raw" else ".png"
+        options = {"streaming": streaming, "png_settings": png_settings}
+    else:
+        job, extensions, suffix = decode_job, IMAGE_EXTENSIONS, ".wav"
+        options = {"max_samples": max_samples, "stretch": stretch}
+
+    files = expand_inputs(inputs, extensions, recursive)
+    if not files:
+        print("No matching input files.", file=sys.stderr)
+        return 1
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    workers = max(1, min(workers, len(files)))
+
+    planned, colliding = plan_outputs(files, out_dir, suffix)
+    failures = len(colliding)
+    for path, target in colliding:
+        print(f"FAILED  {path}: another input also writes {target}", file=sys.stderr)
+    total_bytes = 0
+    start = time.perf_counter()
+    with worker_pool(workers) as pool:
+        futures = {}
+        for path, target in planned:
+            futures[pool.submit(job, path, target, method, **options)] = (path, target)
+        for future in as_completed(futures):
+            path, target = futures[future]
+            try:
+                size, seconds = future.result()
+            except Exception as e:
+                # Bad input, a decoder bug, MemoryError or a dead worker fails that file, not the batch
+                failures += 1
+                print(f"FAILED  {path}: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            total_bytes += size
+            print(f"{seconds:8.3f} s  {path} -> {target}", file=output)
+    elapsed = time.perf_counter() - start
+
+    done = len(files) - failures
+    print(f"{done}/{len(files)} files in {elapsed:.2f} s "
+          f"({done / elapsed:.2f} files/s, {total_bytes / 1e6 / elapsed:.2f} MB/s, "
+          f"{workers} worker(s))", file=output)
+    return failures
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        profiling.enable(os.path.abspath(args.profile), args.profile_memory)
+    if args.command == "serve":
+        from .server import serve
+        return serve(args.host, args.port, args.unix, args.workers, args.max_queue,
+                     output_root=args.output_root)
+    png_settings = images.DEFAULT_PNG
+    if args.command == "encode":
+        png_settings = images.PngSettings(args.compress_level, args.strategy, args.optimize)
+    seconds = getattr(args, "duration", None) or getattr(args, "max_duration", None)
+    failures = run_batch(args.command, args.inputs, args.method, args.workers,
+                         args.out_dir, args.recursive, getattr(args, "stream", False),
+                         getattr(args, "format", "png"), png_settings,
+                         max_samples=int(seconds * codec.SAMPLE_RATE) if seconds else None,
+                         stretch=getattr(args, "duration", None) is not None)
+    return 1 if failures else 0
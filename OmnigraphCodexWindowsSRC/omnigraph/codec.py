@@ -0,0 +1,415 @@
+"""
+Headless Method A/B/C codec.
+
+Everything here works on plain NumPy arrays: mono int16 PCM in, (side, side, 3)
+uint8 RGB out and back again. No Qt, PyAudio or PIL is imported, so the codec can
+run on render servers and in worker processes.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from . import profiling, spectral
+
+SAMPLE_RATE = 44100
+METHODS = ("A", "B", "C")
+
+# Method C band edges in Hz (low -> red, mid -> green, high -> blue)
+LOW_CUTOFF = 1000
+MID_CUTOFF = 4000
+
+# Bumped whenever a method's pixel layout changes incompatibly
+CODEC_VERSION = 1
+
+# What an encoded image needs to be decoded without guessing, stored in PNG
+# text chunks and .omniraw headers
+ImageInfo = namedtuple("ImageInfo", "method sample_count sample_rate codec_version",
+                       defaults=(SAMPLE_RATE, CODEC_VERSION))
+
+
+class CodecError(Exception):
+    """ Raised when audio or image data cannot be converted. """
+
+
+class Cancelled(CodecError):
+    """ Raised from a progress callback to abandon the running job. """
+
+
+def no_progress(stage, fraction):
+    """
+    Default progress callback. Callbacks receive the stage name ("decode",
+    "transform" or "pack") and a 0-1 fraction, or None when the total is unknown,
+    and may raise Cancelled to stop the job.
+    """
+
+
+def normalize_method(method):
+    """ Accepts "A", "b" or a combo box label like "C - Spectral Encoding". """
+    key = str(method).strip()[:1].upper()
+    if key not in METHODS:
+        raise CodecError(f"Unknown encoding method: {method!r}")
+    return key
+
+
+def check_info(info, shape=None):
+    """
+    Validates metadata read from an image and returns it with the method
+    normalized. With the image's (height, width) the sample count is also
+    checked against what that many pixels can hold, which catches resized
+    images that kept their metadata.
+    """
+    if info.codec_version > CODEC_VERSION:
+        raise CodecError(f"Image was encoded with codec version {info.codec_version}, "
+                         f"newer than this build supports ({CODEC_VERSION})")
+    if info.sample_count <= 0:
+        raise CodecError(f"Image metadata has an invalid sample count: {info.sample_count}")
+    method = normalize_method(info.method)
+    if shape is not None:
+        capacity = shape[0] * shape[1] * (1 if method == "C" else 3)
+        if info.sample_count > capacity:
+            raise CodecError(f"Image metadata claims {info.sample_count} samples, but a "
+                             f"{shape[1]}x{shape[0]} Method {method} image holds at most {capacity}")
+    return info._replace(method=method)
+
+
+def _quantize_formula(pcm):
+    return ((pcm.astype(np.float32) + 32768) / 65535 * 255).astype(np.uint8)
+
+
+def _dequantize_formula(values):
+    return ((values.astype(np.float32) / 255) * 65535 - 32768).astype(np.int16)
+
+
+# Lookup tables built once from the original float formulas, so the kernels
+# below stay bit-identical to them. The int16 table is indexed by the sample's
+# raw bits (pcm.view(np.uint16)), which avoids an offset temporary per call.
+_INT16_TO_UINT8 = _quantize_formula(np.arange(65536, dtype=np.uint16).view(np.int16))
+_UINT8_TO_INT16 = _dequantize_formula(np.arange(256, dtype=np.uint8))
+# Quantize then dequantize: what a sample plays back as after a round trip
+_INT16_ROUND_TRIP = _UINT8_TO_INT16[_INT16_TO_UINT8]
+
+
+# np.take widens its indices to intp, so large arrays are looked up in chunks
+# to keep that temporary small (and in cache)
+LOOKUP_CHUNK = 1 << 16
+
+
+def _lookup(table, indices, out=None):
+    if out is None:
+        out = np.empty(indices.shape, dtype=table.dtype)
+    if indices.ndim != 1:
+        # Row by row, so strided views (image planes) are never copied
+        for row, row_out in zip(indices, out):
+            _lookup(table, row, row_out)
+        return out
+    for start in range(0, len(indices), LOOKUP_CHUNK):
+        stop = start + LOOKUP_CHUNK
+        np.take(table, indices[start:stop], out=out[start:stop], mode='wrap')
+    return out
+
+
+def int16_to_uint8(pcm, out=None):
+    """ Quantizes int16 samples to uint8, writing into `out` (any strides) if given. """
+    pcm = np.asarray(pcm, dtype=np.int16)
+    return _lookup(_INT16_TO_UINT8, pcm.view(np.uint16), out)
+
+
+def uint8_to_int16(values, out=None):
+    return _lookup(_UINT8_TO_INT16, np.asarray(values, dtype=np.uint8), out)
+
+
+def int16_round_trip(pcm, out=None):
+    """ The int16 samples that `pcm` decodes back to after uint8 quantization. """
+    pcm = np.asarray(pcm, dtype=np.int16)
+    return _lookup(_INT16_ROUND_TRIP, pcm.view(np.uint16), out)
+
+
+def band_to_uint8(signal, out=None):
+    """ Quantizes a float band signal in [-1, 1) the way Method C stores it. """
+    return int16_to_uint8((signal * 32768).astype(np.int16), out=out)
+
+
+def image_side(count):
+    """ Smallest square side that holds `count` pixels. """
+    return int(np.ceil(np.sqrt(count)))
+
+
+def _square_canvas(count):
+    side = image_side(count)
+    return np.zeros((side, side, 3), dtype=np.uint8)
+
+
+def _encode_a(pcm, progress):
+    total = len(pcm)
+    split_points = [0, total // 3, 2 * total // 3, total]
+    rgb_array = _square_canvas(total - split_points[2])
+    pixels = rgb_array.reshape(-1, 3)
+    # Each third is quantized straight into its plane of the image
+    with profiling.stage("quantize", method="A") as record:
+        for channel in range(3):
+            lo, hi = split_points[channel], split_points[channel + 1]
+            int16_to_uint8(pcm[lo:hi], out=pixels[:hi - lo, channel])
+        record["bytes"] = total
+    progress("transform", 1.0)
+    return rgb_array
+
+
+def _encode_b(pcm, progress):
+    samples = pcm[:len(pcm) - (len(pcm) % 3)].reshape(-1, 3)
+    rgb_array = _square_canvas(len(samples))
+    pixels = rgb_array.reshape(-1, 3)
+    # Stored as R, B, G so neighbouring samples land in contrasting channels
+    with profiling.stage("quantize", method="B") as record:
+        for channel, source in enumerate((0, 2, 1)):
+            int16_to_uint8(samples[:, source], out=pixels[:len(samples), channel])
+        record["bytes"] = samples.size
+    progress("transform", 1.0)
+    return rgb_array
+
+
+def _encode_c(pcm, progress):
+    audio_float = pcm.astype(np.float32) / 32768.0
+    N = len(audio_float)
+    with profiling.stage("fft", method="C") as record:
+        bands = spectral.split_bands(audio_float, SAMPLE_RATE, (LOW_CUTOFF, MID_CUTOFF))
+        record["bytes"] = audio_float.nbytes
+    del audio_float
+    progress("transform", 0.75)
+    rgb_array = _square_canvas(N)
+    pixels = rgb_array.reshape(-1, 3)
+    with profiling.stage("quantize", method="C") as record:
+        for channel in range(3):
+            band_to_uint8(bands[channel], out=pixels[:N, channel])
+        record["bytes"] = 3 * N
+    progress("transform", 1.0)
+    return rgb_array
+
+
+def _decode_a(rgb_array):
+    # Red, green and blue planes hold the first, second and last third of the audio;
+    # (3, H*W) is a view of the image, so the only allocation is the PCM itself
+    planes = rgb_array.transpose(2, 0, 1).reshape(3, -1)
+    return uint8_to_int16(planes).reshape(-1)
+
+
+def _unpack_b(pixels):
+    """ PCM for (n, 3) Method B pixels, read back in R, B, G order. """
+    audio_16bit = np.empty(pixels.shape, dtype=np.int16)
+    for channel, source in enumerate((0, 2, 1)):
+        uint8_to_int16(pixels[:, source], out=audio_16bit[:, channel])
+    return audio_16bit.reshape(-1)
+
+
+def _decode_b(rgb_array):
+    return _unpack_b(rgb_array.reshape(-1, 3))
+
+
+def _mix_c(red, green, blue):
+    red_16 = uint8_to_int16(red)
+    green_16 = uint8_to_int16(green)
+    blue_16 = uint8_to_int16(blue)
+    return (red_16 * 0.6 + green_16 * 0.3 + blue_16 * 0.1).astype(np.int16)
+
+
+def _decode_c(rgb_array):
+    pixels = rgb_array.reshape(-1, 3)
+    return _mix_c(pixels[:, 0], pixels[:, 1], pixels[:, 2])
+
+
+def _plane_segments(pixel_count, sample_count=None):
+    """
+    (start, length) of the audio stored in each Method A plane. Without a known
+    sample count every plane is assumed full, as legacy decoding always did; a
+    count too large for the image is clamped to full planes, as B and C do.
+    """
+    if sample_count is None:
+        return [(0, pixel_count), (pixel_count, pixel_count), (2 * pixel_count, pixel_count)]
+    split_points = [sample_count // 3, 2 * sample_count // 3]
+    lengths = [min(pixel_count, length) for length in
+               (split_points[0], split_points[1] - split_points[0], sample_count - split_points[1])]
+    return [(0, lengths[0]), (lengths[0], lengths[1]), (lengths[0] + lengths[1], lengths[2])]
+
+
+def decoded_length(shape, method, sample_count=None):
+    """ Number of samples `decode` yields for an image of `shape`. """
+    pixel_count = shape[0] * shape[1]
+    method = normalize_method(method)
+    if method == "A":
+        return sum(length for _, length in _plane_segments(pixel_count, sample_count))
+    if method == "B":
+        full = pixel_count * 3
+        return full if sample_count is None else min(full, sample_count - sample_count % 3)
+    return pixel_count if sample_count is None else min(pixel_count, sample_count)
+
+
+def pixels_for_samples(sample_count, method):
+    """ Fewest pixels that `decode` turns into at least `sample_count` samples. """
+    if normalize_method(method) == "C":
+        return sample_count
+    return -(-sample_count // 3)
+
+
+# Method B sample offset within a pixel -> channel it is stored in (R, B, G order)
+_B_CHANNELS = np.array([0, 2, 1])
+
+
+def sample_locations(positions, method, shape, sample_count=None):
+    """
+    (pixel index, channel) holding each sample position in an image of `shape`,
+    the inverse of the packing done by `encode`. Positions are clamped to the
+    decoded length. Method C spreads every sample over all three channels, which
+    is reported as channel -1.
+    """
+    method = normalize_method(method)
+    pixel_count = shape[0] * shape[1]
+    last = max(0, decoded_length(shape, method, sample_count) - 1)
+    positions = np.clip(np.asarray(positions, dtype=np.int64), 0, last)
+    if method == "A":
+        # Planes may be empty for very short audio; searchsorted skips past them
+        starts = np.array([offset for offset, _ in _plane_segments(pixel_count, sample_count)])
+        channels = np.searchsorted(starts, positions, side="right") - 1
+        return positions - starts[channels], channels
+    if method == "B":
+        return positions // 3, _B_CHANNELS[positions % 3]
+    return positions, np.full(positions.shape, -1)
+
+
+def decode_range(rgb, method, start, stop, sample_count=None):
+    """
+    Decodes samples [start, stop) only, touching just the pixels that hold them,
+    so a slice of an np.memmap'd image can be decoded without reading the rest.
+    """
+    method = normalize_method(method)
+    stop = min(stop, decoded_length(rgb.shape, method, sample_count))
+    start = max(0, min(start, stop))
+    pixels = rgb.reshape(-1, 3)
+    if method == "A":
+        audio_16bit = np.empty(stop - start, dtype=np.int16)
+        for channel, (offset, length) in enumerate(_plane_segments(len(pixels), sample_count)):
+            lo = max(start, offset)
+            hi = min(stop, offset + length)
+            if lo < hi:
+                audio_16bit[lo - start:hi - start] = uint8_to_int16(pixels[lo - offset:hi - offset, channel])
+        return audio_16bit
+    if method == "B":
+        first = start // 3
+        audio_16bit = _unpack_b(pixels[first:(stop + 2) // 3])
+        return audio_16bit[start - 3 * first:stop - 3 * first]
+    block = pixels[start:stop]
+    return _mix_c(block[:, 0], block[:, 1], block[:, 2])
+
+
+def _region(shape, top, left, height, width):
+    """ Rectangle clipped to the image, and the flat pixel index of each of its pixels, row by row. """
+    top, left = max(0, int(top)), max(0, int(left))
+    height = max(0, min(int(height), shape[0] - top))
+    width = max(0, min(int(width), shape[1] - left))
+    rows = np.arange(top, top + height, dtype=np.int64)[:, None] * shape[1]
+    return (top, left, height, width), (rows + np.arange(left, left + width)).reshape(-1)
+
+
+def _region_planes(shape, method, indices, sample_count):
+    """
+    (channel, pixels with audio) for a region: rectangle indices increase, so
+    the pixels that hold audio rather than padding are a prefix of them.
+    """
+    pixel_count = shape[0] * shape[1]
+    if method == "A":
+        return [(channel, np.searchsorted(indices, length))
+                for channel, (_, length) in enumerate(_plane_segments(pixel_count, sample_count))]
+    used = decoded_length(shape, method, sample_count)
+    return [(-1, np.searchsorted(indices, used // 3 if method == "B" else used))]
+
+
+def decode_region(rgb, method, top, left, height, width, sample_count=None):
+    """
+    Decodes only the pixels inside a rectangle, in playback order: row by row,
+    and for Method A the red, green and blue planes in turn (a slice of each
+    third of the audio). Padding pixels are skipped. Only the rectangle is read,
+    so the cost follows its area rather than the image's.
+    """
+    method = normalize_method(method)
+    (top, left, height, width), indices = _region(rgb.shape, top, left, height, width)
+    pixels = np.asarray(rgb[top:top + height, left:left + width]).reshape(-1, 3)
+    planes = _region_planes(rgb.shape, method, indices, sample_count)
+    if method == "A":
+        return np.concatenate([uint8_to_int16(pixels[:used, channel]) for channel, used in planes])
+    used = planes[0][1]
+    if method == "B":
+        return _unpack_b(pixels[:used])
+    return _mix_c(pixels[:used, 0], pixels[:used, 1], pixels[:used, 2])
+
+
+def region_locations(shape, method, top, left, height, width, sample_count=None):
+    """ (pixel index, channel) of each sample `decode_region` returns, as in `sample_locations`. """
+    method = normalize_method(method)
+    _, indices = _region(shape, top, left, height, width)
+    planes = _region_planes(shape, method, indices, sample_count)
+    if method == "A":
+        return (np.concatenate([indices[:used] for _, used in planes]),
+                np.concatenate([np.full(used, channel) for channel, used in planes]))
+    used = planes[0][1]
+    if method == "B":
+        return np.repeat(indices[:used], 3), np.tile(_B_CHANNELS, used)
+    return indices[:used], np.full(used, -1)
+
+
+def decode_blocks(rgb, method, sample_count=None, block_samples=1 << 20):
+    """ Yields what `decode` returns, `block_samples` at a time, via decode_range. """
+    total = decoded_length(rgb.shape, method, sample_count)
+    for start in range(0, total, block_samples):
+        yield decode_range(rgb, method, start, start + block_samples, sample_count)
+
+
+_ENCODERS = {"A": _encode_a, "B": _encode_b, "C": _encode_c}
+_DECODERS = {"A": _decode_a, "B": _decode_b, "C": _decode_c}
+
+
+def encode(pcm, method, progress=no_progress):
+    """
+    Encodes mono int16 PCM (44.1 kHz) into a square (side, side, 3) uint8 RGB array.
+    """
+    return encode_with_playback(pcm, method, progress, playback=False)[0]
+
+
+def encode_with_playback(pcm, method, progress=no_progress, playback=True):
+    """
+    Encodes like `encode` and also returns the PCM that decoding the image would
+    give (without padding). For A and B this comes straight from the source
+    samples through the round-trip table instead of re-reading the image.
+    """
+    pcm = np.asarray(pcm)
+    if pcm.ndim != 1:
+        raise CodecError(f"Expected mono PCM, got an array of shape {pcm.shape}")
+    if pcm.size == 0:
+        raise CodecError("No PCM samples were provided.")
+    method = normalize_method(method)
+    rgb_array = _ENCODERS[method](pcm.astype(np.int16, copy=False), progress)
+    progress("pack", 1.0)
+    if not playback:
+        return rgb_array, None
+    if method == "A":
+        return rgb_array, int16_round_trip(pcm)
+    if method == "B":
+        return rgb_array, int16_round_trip(pcm[:len(pcm) - len(pcm) % 3])
+    pixels = rgb_array.reshape(-1, 3)[:len(pcm)]
+    return rgb_array, _mix_c(pixels[:, 0], pixels[:, 1], pixels[:, 2])
+
+
+def decode(rgb, method, sample_count=None):
+    """
+    Decodes an (H, W, 3) uint8 RGB array back into mono int16 PCM. When the
+    original `sample_count` is known the square padding is left out.
+    """
+    if not isinstance(rgb, np.memmap):
+        rgb = np.asarray(rgb)
+    if rgb.ndim != 3 or rgb.shape[2] != 3:
+        raise CodecError(f"Expected an RGB image array, got shape {rgb.shape}")
+    with profiling.stage("decode", method=method) as record:
+        if sample_count is not None:
+            stop = decoded_length(rgb.shape, method, sample_count)
+            audio_16bit = decode_range(rgb, method, 0, stop, sample_count)
+        else:
+            audio_16bit = _DECODERS[normalize_method(method)](rgb.astype(np.uint8, copy=False))
+        record["bytes"] = audio_16bit.nbytes
+    return audio_16bit
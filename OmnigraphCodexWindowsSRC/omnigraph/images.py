@@ -0,0 +1,197 @@
+"""
+Image file I/O for encoded RGB arrays. PIL is imported on first use so that
+importing the codec stays cheap.
+
+Encoded PNGs carry a codec.ImageInfo as compact JSON in a tEXt chunk ahead of
+the pixel data, so decoders can read the method and sample count from the
+first few hundred bytes of the file.
+"""
+import json
+import math
+import struct
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import profiling
+from .codec import CodecError, ImageInfo, check_info
+
+# zlib strategies selectable for PNG export. See benchmarks/bench_png_export.py:
+# on Omnigraph images "rle" is usually both smaller and faster than "default".
+PNG_STRATEGIES = {
+    "default": zlib.Z_DEFAULT_STRATEGY,
+    "filtered": zlib.Z_FILTERED,
+    "huffman": zlib.Z_HUFFMAN_ONLY,
+    "rle": zlib.Z_RLE,
+    "fixed": zlib.Z_FIXED,
+}
+
+PngSettings = namedtuple("PngSettings", "compress_level strategy optimize", defaults=(6, "default", False))
+DEFAULT_PNG = PngSettings()
+# Above this many pixels the GUI writes exports on a background thread
+BACKGROUND_EXPORT_PIXELS = 1500 * 1500
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+INFO_KEYWORD = "OmnigraphCodex"
+
+
+def load_rgb(image_path, max_pixels=None):
+    """
+    Reads any PIL-readable image as an (H, W, 3) uint8 array. With `max_pixels`,
+    larger images are shrunk by whole factors while they are read (see
+    `_reduce`), keeping at least `max_pixels` pixels.
+    """
+    from PIL import Image
+    with profiling.stage("image_build") as record, Image.open(image_path) as img:
+        if max_pixels and img.width * img.height > max_pixels:
+            img = _reduce(img, max_pixels)
+        rgb_array = np.array(img.convert("RGB"))
+        record["bytes"] = rgb_array.nbytes
+    return rgb_array
+
+
+def _reduce(img, max_pixels):
+    """
+    JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale (Image.draft), so the
+    full-size photo never exists in memory; Image.reduce box-filters the rest.
+    """
+    factor = int(math.sqrt(img.width * img.height / max_pixels))
+    if factor < 2:
+        return img
+    img.draft("RGB", (img.width // factor, img.height // factor))
+    factor = int(math.sqrt(img.width * img.height / max_pixels))
+    if factor < 2:
+        return img
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGB")  # Image.reduce has no palette or bilevel support
+    return img.reduce(factor)
+
+
+def read_size(image_path):
+    """ (height, width) from the image header, without decoding the pixels. """
+    from PIL import Image
+    with Image.open(image_path) as img:
+        return img.height, img.width
+
+
+def _pil_png_options(settings):
+    return {"compress_level": settings.compress_level,
+            "compress_type": PNG_STRATEGIES[settings.strategy],
+            "optimize": settings.optimize}
+
+
+def info_text(info):
+    return json.dumps({"method": info.method, "samples": int(info.sample_count),
+                       "rate": int(info.sample_rate), "codec": int(info.codec_version)},
+                      separators=(",", ":"))
+
+
+def parse_info_text(text, shape=None):
+    try:
+        fields = json.loads(text)
+        info = ImageInfo(fields["method"], int(fields["samples"]), int(fields["rate"]), int(fields["codec"]))
+    except (ValueError, KeyError, TypeError) as e:
+        raise CodecError(f"Unreadable {INFO_KEYWORD} metadata: {e}") from None
+    return check_info(info, shape)
+
+
+def read_info(image_path):
+    """
+    Returns the ImageInfo stored in an encoded PNG, or None for other files and
+    for PNGs written before images carried metadata. Only the chunks ahead of
+    the pixel data are read; the sample count is checked against the IHDR size.
+    """
+    shape = None
+    with open(image_path, 'rb') as handle:
+        if handle.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            return None
+        while True:
+            header = handle.read(8)
+            if len(header) < 8:
+                return None
+            length, chunk_type = struct.unpack(">I4s", header)
+            if chunk_type in (b"IDAT", b"IEND"):
+                return None
+            data = handle.read(length)
+            handle.seek(4, 1)  # CRC
+            if chunk_type == b"IHDR":
+                width, height = struct.unpack(">II", data[:8])
+                shape = (height, width)
+            elif chunk_type == b"tEXt":
+                keyword, _, text = data.partition(b"\x00")
+                if keyword.decode("latin-1") == INFO_KEYWORD:
+                    return parse_info_text(text.decode("latin-1"), shape)
+
+
+def save_png(rgb_array, image_path, settings=DEFAULT_PNG, info=None):
+    from PIL import Image
+    options = _pil_png_options(settings)
+    if info is not None:
+        from PIL.PngImagePlugin import PngInfo
+        options["pnginfo"] = PngInfo()
+        options["pnginfo"].add_text(INFO_KEYWORD, info_text(info))
+    rgb_array = np.asarray(rgb_array)
+    with profiling.stage("png_save") as record:
+        Image.fromarray(rgb_array, 'RGB').save(image_path, "PNG", **options)
+        record["bytes"] = rgb_array.nbytes
+
+
+def save_pil_png(image, image_path, settings=DEFAULT_PNG):
+    """ Saves an existing PIL image (path or file object) with the export settings. """
+    image.save(image_path, "PNG", **_pil_png_options(settings))
+
+
+class BackgroundWriter:
+    """
+    Writes PNGs on worker threads. zlib releases the GIL while compressing, so
+    exports overlap with the UI event loop or with the next batch job.
+    """
+
+    def __init__(self, max_workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="png-writer")
+
+    def submit(self, rgb_array, image_path, settings=DEFAULT_PNG, info=None):
+        """ Returns a Future that resolves to `image_path` once the file is written. """
+        def write():
+            save_png(rgb_array, image_path, settings, info)
+            return image_path
+        return self._pool.submit(write)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+def _png_chunk(handle, chunk_type, data):
+    handle.write(struct.pack(">I", len(data)))
+    handle.write(chunk_type)
+    handle.write(data)
+    handle.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF))
+
+
+def write_png_rows(rgb_array, image_path, settings=DEFAULT_PNG, rows_per_chunk=256, info=None):
+    """
+    Writes an (H, W, 3) uint8 array as PNG a band of rows at a time, so an
+    np.memmap'd image is compressed without ever being loaded whole.
+    `settings.optimize` is ignored here.
+    """
+    height, width = rgb_array.shape[:2]
+    compressor = zlib.compressobj(settings.compress_level, zlib.DEFLATED, 15, 8,
+                                  PNG_STRATEGIES[settings.strategy])
+    with profiling.stage("png_save", streamed=True) as record, open(image_path, 'wb') as handle:
+        record["bytes"] = height * width * 3
+        handle.write(PNG_SIGNATURE)
+        _png_chunk(handle, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        if info is not None:
+            _png_chunk(handle, b"tEXt", INFO_KEYWORD.encode("latin-1") + b"\x00" + info_text(info).encode("latin-1"))
+        for top in range(0, height, rows_per_chunk):
+            rows = np.asarray(rgb_array[top:top + rows_per_chunk]).reshape(-1, width * 3)
+            # Every scanline starts with filter type 0 (None)
+            scanlines = np.zeros((len(rows), width * 3 + 1), dtype=np.uint8)
+            scanlines[:, 1:] = rows
+            data = compressor.compress(scanlines.tobytes())
+            if data:
+                _png_chunk(handle, b"IDAT", data)
+        _png_chunk(handle, b"IDAT", compressor.flush())
+        _png_chunk(handle, b"IEND", b"")
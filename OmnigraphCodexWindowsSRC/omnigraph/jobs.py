@@ -0,0 +1,145 @@
+"""
+File-level encode and decode jobs as run by the GUI's worker threads.
+
+Each job reports progress through a callback (see codec.no_progress) that may
+raise codec.Cancelled, and returns plain data; showing results or errors is
+left to the caller.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from . import codec, images, pcm, rawimage
+from .cache import source_key
+from .codec import no_progress
+
+EncodeResult = namedtuple("EncodeResult", "rgb sample_count playback method")
+DecodeResult = namedtuple("DecodeResult", "rgb pcm method sample_count")
+ImageResult = namedtuple("ImageResult", "rgb method sample_count")
+
+
+def encode_audio_file(audio_path, method, progress=no_progress, cache=None):
+    """
+    Loads and encodes an audio file. `playback` is the lossy PCM the image
+    decodes to, produced in the same pass rather than by decoding the image.
+    With a ResultCache the source PCM and each method's result are reused.
+    """
+    method = codec.normalize_method(method)
+    key = source_key(audio_path) if cache is not None else None
+    if key is not None:
+        cached = cache.get(("encoded", key, method))
+        if cached is not None:
+            return cached
+
+    progress("decode", 0.0)
+    audio_data = cache.get(("pcm", key)) if key is not None else None
+    if audio_data is None:
+        audio_data = pcm.load_pcm(audio_path, progress=progress)
+        if key is not None:
+            cache.put(("pcm", key), audio_data)
+    progress("decode", 1.0)
+    rgb_array, playback = codec.encode_with_playback(audio_data, method, progress)
+    result = EncodeResult(rgb_array, len(audio_data), playback, method)
+    if key is not None:
+        cache.put(("encoded", key, method), result)
+    return result
+
+
+def read_image_info(image_path):
+    """ The codec.ImageInfo stored in an encoded image file, or None for legacy images. """
+    if rawimage.is_raw_path(image_path):
+        return rawimage.header_info(rawimage.read_header(image_path))
+    return images.read_info(image_path)
+
+
+def _resolve_info(image_input, method, sample_count):
+    """ Method and sample count to decode with: the file's own metadata when it has any. """
+    method = codec.normalize_method(method)
+    if isinstance(image_input, str):
+        info = read_image_info(image_input)
+        if info is not None:
+            return info.method, info.sample_count
+    return method, sample_count
+
+
+def _load_pixels(image_input, key, cache):
+    if not isinstance(image_input, str):
+        return image_input
+    if rawimage.is_raw_path(image_input):
+        # Memory-mapped pixels are cheap to reopen, so they are never cached
+        return rawimage.open_raw(image_input)[1]
+    rgb_array = cache.get(("image", key)) if key is not None else None
+    if rgb_array is None:
+        rgb_array = images.load_rgb(image_input)
+        if key is not None:
+            cache.put(("image", key), rgb_array)
+    return rgb_array
+
+
+def sonify_blocks(image_path, method, samples, stretch=False):
+    """
+    Decodes any picture to at most `samples` samples (exactly `samples` with
+    `stretch`), for photos whose full decode would run for many minutes. The
+    image is shrunk to about the pixels that many samples need while it is read,
+    decoded, and linearly resampled a block at a time, so time and memory follow
+    the output length rather than the photo's resolution.
+    Returns (reduced pixels, iterator of int16 blocks, total samples).
+    """
+    method = codec.normalize_method(method)
+    rgb_array = images.load_rgb(image_path, max_pixels=codec.pixels_for_samples(samples, method))
+    audio_16bit = codec.decode(rgb_array, method)
+    total = samples if stretch else min(samples, len(audio_16bit))
+    return rgb_array, pcm.iter_resampled(audio_16bit, total), total
+
+
+def open_image(image_input, method, sample_count=None, progress=no_progress, cache=None, max_samples=None):
+    """
+    Loads an image's pixels and resolves how to decode them, without decoding:
+    playback.ImageSource and codec.decode_range decode only what they need.
+
+    An image without Omnigraph metadata (a photo) that would decode to more
+    than `max_samples` is sonified instead (see sonify_blocks), and comes back
+    as a DecodeResult holding the shrunk pixels and the resampled PCM.
+    """
+    method, sample_count = _resolve_info(image_input, method, sample_count)
+    if (max_samples and sample_count is None and isinstance(image_input, str)
+            and codec.decoded_length(images.read_size(image_input), method) > max_samples):
+        progress("decode", 0.0)
+        rgb_array, blocks, total = sonify_blocks(image_input, method, max_samples)
+        audio_16bit = np.empty(total, dtype=np.int16)
+        filled = 0
+        for block in blocks:
+            audio_16bit[filled:filled + len(block)] = block
+            filled += len(block)
+        progress("decode", 1.0)
+        return DecodeResult(rgb_array, audio_16bit, method, None)
+    key = source_key(image_input) if cache is not None and isinstance(image_input, str) else None
+    progress("decode", 0.0)
+    rgb_array = _load_pixels(image_input, key, cache)
+    progress("decode", 1.0)
+    return ImageResult(rgb_array, method, sample_count)
+
+
+def decode_image(image_input, method, sample_count=None, progress=no_progress, cache=None):
+    """
+    Decodes an image path or RGB array. Files that carry Omnigraph metadata
+    decode with their own method and sample count; `method` is the fallback for
+    legacy images. With a ResultCache, decoded pixels and each method's PCM are
+    reused for files.
+    """
+    method, sample_count = _resolve_info(image_input, method, sample_count)
+    key = source_key(image_input) if cache is not None and isinstance(image_input, str) else None
+    if key is not None:
+        cached = cache.get(("decoded", key, method))
+        if cached is not None:
+            return cached
+
+    progress("decode", 0.0)
+    rgb_array = _load_pixels(image_input, key, cache)
+    progress("decode", 1.0)
+    audio_16bit = codec.decode(rgb_array, method, sample_count)
+    progress("transform", 1.0)
+    result = DecodeResult(rgb_array, audio_16bit, method, sample_count)
+    if key is not None:
+        cache.put(("decoded", key, method), result)
+    return result
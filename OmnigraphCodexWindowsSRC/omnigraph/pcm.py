@@ -0,0 +1,303 @@
+"""
+Audio file I/O for the codec: ffmpeg decoding to mono 44.1 kHz int16 PCM and
+WAV wrapping of decoded PCM. PCM WAV (and FLAC/OGG when the optional
+soundfile package is installed) is read in-process; everything else goes
+through ffmpeg, which writes raw s16le to a pipe so no temporary file is made.
+"""
+import contextlib
+import io
+import os
+from functools import partial
+import subprocess
+import threading
+import wave
+
+import numpy as np
+
+from . import profiling
+from .codec import SAMPLE_RATE, CodecError, no_progress
+
+
+# ffmpeg is read in blocks of this many bytes; the buffer grows geometrically
+READ_BLOCK = 1 << 20
+_ZERO_BLOCK = bytes(READ_BLOCK)
+# Decoded bytes (mono 44.1 kHz s16) per input byte, to presize the ffmpeg buffer;
+# lossy formats expand most. Rough figures for typical bitrates, on the low side
+PCM_EXPANSION = {'.mp3': 4.0, '.ogg': 4.0, '.opus': 6.0, '.m4a': 4.0, '.aac': 4.0,
+                 '.flac': 0.8, '.wav': 0.4}
+# Native decoding reads, downmixes and resamples this many frames at a time
+NATIVE_BLOCK_FRAMES = 1 << 18
+
+# Formats decoded in-process when the optional soundfile package is available
+SOUNDFILE_EXTENSIONS = ('.flac', '.ogg')
+_SOUNDFILE = False  # False until the first lookup, then the module or None
+
+
+class NativeDecodeUnavailable(Exception):
+    """ The file needs ffmpeg; raised internally to trigger the fallback. """
+
+
+def ffmpeg_command(audio_path):
+    return [
+        "ffmpeg", "-nostdin", "-i", audio_path,
+        "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-c:a", "pcm_s16le",
+        "-hide_banner", "-loglevel", "error", "-"
+    ]
+
+
+def estimate_pcm_bytes(audio_path):
+    """ Rough size of the PCM ffmpeg makes of `audio_path`, from the file size; 0 if unknown. """
+    try:
+        size = os.path.getsize(audio_path)
+    except OSError:
+        return 0
+    return int(size * PCM_EXPANSION.get(os.path.splitext(audio_path)[1].lower(), 1.0))
+
+
+def _grow(buffer, extra):
+    """ Appends `extra` bytes (rounded up to READ_BLOCK) without a temporary that large. """
+    for _ in range(-(-extra // READ_BLOCK)):
+        buffer.extend(_ZERO_BLOCK)
+
+
+def read_into_buffer(stream, size_hint=0, progress=no_progress):
+    """
+    Reads a binary stream to EOF with readinto() into one growing bytearray, so
+    the data is never copied into intermediate bytes objects. The buffer starts
+    at `size_hint` and only doubles once the stream has shown it holds more.
+    """
+    buffer = bytearray(max(size_hint, READ_BLOCK))
+    view = memoryview(buffer)
+    filled = 0
+    while True:
+        if filled == len(buffer):
+            # Full; an exact size_hint must not cost a doubling just to find EOF
+            probe = stream.read(READ_BLOCK)
+            if not probe:
+                break
+            view.release()
+            _grow(buffer, len(buffer))
+            buffer[filled:filled + len(probe)] = probe
+            filled += len(probe)
+            view = memoryview(buffer)
+            progress("decode", None)
+            continue
+        count = stream.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+        progress("decode", None)
+    view.release()
+    del buffer[filled:]
+    return buffer
+
+
+@contextlib.contextmanager
+def ffmpeg_pipe(audio_path):
+    """
+    Runs ffmpeg on `audio_path` and yields its stdout, a raw mono 44.1 kHz s16le
+    stream. Read it to EOF; a failing ffmpeg raises CodecError on exit.
+    """
+    try:
+        process = subprocess.Popen(ffmpeg_command(audio_path), stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise CodecError("FFmpeg was not found on PATH")
+
+    # Drain stderr on the side so a chatty ffmpeg can never block on a full pipe
+    errors = []
+    stderr_reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+    stderr_reader.start()
+    completed = False
+    try:
+        yield process.stdout
+        completed = True
+    finally:
+        if not completed:
+            process.kill()
+        process.stdout.close()
+        returncode = process.wait()
+        stderr_reader.join()
+        process.stderr.close()
+    if returncode != 0:
+        message = errors[0].decode(errors='replace') if errors else ""
+        raise CodecError(f"FFmpeg failed: {message}")
+
+
+def load_pcm_ffmpeg(audio_path, progress=no_progress):
+    """ Decodes any ffmpeg-readable audio file to mono 44.1 kHz int16 PCM. """
+    with profiling.stage("ffmpeg") as record:
+        with ffmpeg_pipe(audio_path) as stdout:
+            raw_data = read_into_buffer(stdout, estimate_pcm_bytes(audio_path), progress)
+        record["bytes"] = len(raw_data)
+    usable = len(raw_data) - (len(raw_data) % 2)
+    return np.frombuffer(raw_data, dtype=np.int16, count=usable // 2)
+
+
+def _soundfile():
+    """ Returns the optional libsndfile binding, or None when it isn't installed. """
+    global _SOUNDFILE
+    if _SOUNDFILE is False:
+        try:
+            import soundfile
+        except (ImportError, OSError):
+            soundfile = None
+        _SOUNDFILE = soundfile
+    return _SOUNDFILE
+
+
+def _pcm_bytes_to_int16(raw_data, sample_width):
+    """ Converts interleaved little-endian integer PCM of any WAV width to int16. """
+    if sample_width == 2:
+        return np.frombuffer(raw_data, dtype='<i2')
+    if sample_width == 1:
+        # 8-bit WAV is unsigned
+        return ((np.frombuffer(raw_data, dtype=np.uint8).astype(np.int16) - 128) << 8)
+    if sample_width == 3:
+        triplets = np.frombuffer(raw_data, dtype=np.uint8).reshape(-1, 3)
+        # The top two bytes of a 24-bit sample are its 16-bit value
+        return np.ascontiguousarray(triplets[:, 1:]).view('<i2').reshape(-1)
+    if sample_width == 4:
+        return (np.frombuffer(raw_data, dtype='<i4') >> 16).astype(np.int16)
+    raise NativeDecodeUnavailable(f"Unsupported WAV sample width: {sample_width}")
+
+
+def _downmix(samples, channels):
+    """ Averages interleaved int16 channels to mono. """
+    if channels == 1:
+        return samples
+    frames = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+    return np.round(frames.mean(axis=1, dtype=np.float32)).astype(np.int16)
+
+
+def to_mono_44k(samples, channels, sample_rate):
+    """
+    Downmixes interleaved int16 samples to mono and resamples to 44.1 kHz.
+    Mono 44.1 kHz input is returned unchanged.
+    """
+    samples = _downmix(samples, channels)
+    if sample_rate != SAMPLE_RATE and len(samples):
+        samples = resample_linear(samples, sample_rate)
+    return samples
+
+
+def _read_mono_44k(blocks, frame_count, channels, sample_rate):
+    """
+    Downmixes interleaved int16 blocks into one preallocated mono array and
+    resamples it a block at a time, so no temporary is as long as the file.
+    """
+    mono = np.empty(frame_count, dtype=np.int16)
+    filled = 0
+    for block in blocks:
+        block = _downmix(block, channels)
+        if filled + len(block) > frame_count:
+            raise NativeDecodeUnavailable("More frames than the header declares")
+        mono[filled:filled + len(block)] = block
+        filled += len(block)
+    mono = mono[:filled]
+    if sample_rate != SAMPLE_RATE and filled:
+        mono = resample_linear(mono, sample_rate)
+    return mono
+
+
+def resample_linear(samples, sample_rate):
+    """ Linear-interpolation resample of int16 PCM from `sample_rate` to 44.1 kHz. """
+    out_count = int(round(len(samples) * SAMPLE_RATE / sample_rate))
+    resampled = np.empty(out_count, dtype=np.int16)
+    filled = 0
+    for block in iter_resampled(samples, out_count, NATIVE_BLOCK_FRAMES, step=sample_rate / SAMPLE_RATE):
+        resampled[filled:filled + len(block)] = block
+        filled += len(block)
+    return resampled
+
+
+def iter_resampled(samples, out_count, block_samples=1 << 20, step=None):
+    """
+    Linearly resamples int16 PCM to `out_count` samples, yielding blocks so the
+    output never has to exist in one piece. Output sample i is read at input
+    position i * `step`, which defaults to spreading `samples` over `out_count`.
+    """
+    if step is None:
+        if out_count == len(samples):
+            for start in range(0, out_count, block_samples):
+                yield samples[start:start + block_samples]
+            return
+        step = len(samples) / out_count
+    for start in range(0, out_count, block_samples):
+        positions = np.arange(start, min(start + block_samples, out_count), dtype=np.float64) * step
+        lo = int(positions[0])
+        hi = min(len(samples), int(positions[-1]) + 2)
+        resampled = np.interp(positions - lo, np.arange(hi - lo), samples[lo:hi])
+        yield np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+
+
+def load_pcm_native(audio_path):
+    """
+    Decodes PCM WAV with the standard library (and FLAC/OGG through soundfile
+    when it is installed) without starting a process.
+    """
+    if audio_path.lower().endswith('.wav'):
+        try:
+            with wave.open(audio_path, 'rb') as wav_file:
+                sample_width = wav_file.getsampwidth()
+                blocks = (_pcm_bytes_to_int16(raw_data, sample_width) for raw_data in
+                          iter(partial(wav_file.readframes, NATIVE_BLOCK_FRAMES), b""))
+                return _read_mono_44k(blocks, wav_file.getnframes(), wav_file.getnchannels(),
+                                      wav_file.getframerate())
+        except (wave.Error, EOFError) as e:
+            # Float, A-law, extensible headers, ... are left to ffmpeg
+            raise NativeDecodeUnavailable(str(e))
+
+    soundfile = _soundfile()
+    if soundfile is None or not audio_path.lower().endswith(SOUNDFILE_EXTENSIONS):
+        raise NativeDecodeUnavailable(audio_path)
+    try:
+        with soundfile.SoundFile(audio_path) as sound_file:
+            blocks = (frames.reshape(-1) for frames in
+                      sound_file.blocks(NATIVE_BLOCK_FRAMES, dtype='int16', always_2d=True))
+            return _read_mono_44k(blocks, sound_file.frames, sound_file.channels, sound_file.samplerate)
+    except RuntimeError as e:
+        raise NativeDecodeUnavailable(str(e))
+
+
+def load_pcm(audio_path, native=True, progress=no_progress):
+    """
+    Loads any supported audio file as mono 44.1 kHz int16 PCM, reading WAV (and
+    FLAC/OGG with soundfile) in-process and falling back to ffmpeg otherwise.
+    """
+    if native:
+        try:
+            with profiling.stage("pcm_read") as record:
+                samples = load_pcm_native(audio_path)
+                record["bytes"] = samples.nbytes
+            return samples
+        except NativeDecodeUnavailable:
+            pass
+    return load_pcm_ffmpeg(audio_path, progress)
+
+
+def write_wav(target, pcm):
+    """ Writes mono 44.1 kHz int16 PCM to a path or binary file object. """
+    with wave.open(target, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(np.ascontiguousarray(pcm, dtype=np.int16).tobytes())
+
+
+def write_wav_blocks(target, blocks):
+    """ Writes an iterable of int16 PCM blocks as one WAV, holding one block at a time. """
+    with wave.open(target, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        for block in blocks:
+            wav_file.writeframes(np.ascontiguousarray(block, dtype=np.int16).tobytes())
+
+
+def wav_bytes(pcm):
+    """ Returns a rewound BytesIO holding `pcm` as a WAV file. """
+    audio_buffer = io.BytesIO()
+    write_wav(audio_buffer, pcm)
+    audio_buffer.seek(0)
+    return audio_buffer
@@ -0,0 +1,232 @@
+"""
+Realtime-safe playback of mono int16 PCM through PyAudio.
+
+The PortAudio callback runs on the audio thread, so `PlaybackSource.callback`
+does no printing, locking or copying: it hands PortAudio a read-only memoryview
+slice of the PCM (or of a preallocated silence buffer) and advances a position
+counter. The counter has a single writer (the audio thread, or the feeder thread
+in blocking mode); the UI only reads it, or seeks while playback is stopped, so
+plain attribute reads and writes are atomic enough under the GIL.
+
+`ImageSource` plays an encoded image without decoding it up front: a
+read-ahead thread decodes fixed-size blocks just ahead of the play position, so
+starting and seeking cost one block whatever the image size.
+
+PyAudio itself is only touched through the instance passed to `Player`.
+"""
+import os
+import threading
+
+import numpy as np
+
+from .codec import SAMPLE_RATE, decode_range, decoded_length, normalize_method
+
+FRAMES_PER_BUFFER = 1024
+# ImageSource decodes this many samples at a time (about 1.5 s), and keeps this many blocks ahead
+BLOCK_SAMPLES = 1 << 16
+READ_AHEAD = 4
+# "callback" (default) or "blocking" (writes from a feeder thread). Override with OMNIGRAPH_PLAYBACK.
+DEFAULT_MODE = os.environ.get("OMNIGRAPH_PLAYBACK", "callback")
+
+# PortAudio callback results and status flags, as exported by pyaudio
+PA_CONTINUE = 0
+PA_COMPLETE = 1
+PA_OUTPUT_UNDERFLOW = 0x4
+PA_INT16 = 0x8
+
+
+class PlaybackSource:
+    """ PCM, play position and underrun count shared by the audio and UI threads. """
+
+    def __init__(self, pcm_16bit):
+        samples = np.ascontiguousarray(pcm_16bit, dtype=np.int16).view()
+        samples.flags.writeable = False  # PyAudio only accepts read-only buffers
+        self._bytes = memoryview(samples).cast('B')
+        self._silence = memoryview(bytes(FRAMES_PER_BUFFER * 2))
+        self.total = len(samples)
+        self.position = 0
+        self.underruns = 0
+
+    @property
+    def finished(self):
+        return self.position >= self.total
+
+    def seek(self, position):
+        self.position = max(0, min(int(position), self.total))
+
+    def read(self, frame_count):
+        """ Zero-copy view of the next `frame_count` samples (shorter at the end). """
+        start = self.position
+        end = min(start + frame_count, self.total)
+        self.position = end
+        return self._bytes[2 * start:2 * end]
+
+    def silence(self, frame_count):
+        if frame_count <= FRAMES_PER_BUFFER:
+            return self._silence[:2 * frame_count]
+        return bytes(2 * frame_count)
+
+    def callback(self, in_data, frame_count, time_info, status):
+        """ PyAudio stream callback. """
+        if status & PA_OUTPUT_UNDERFLOW:
+            self.underruns += 1
+        if self.position >= self.total:
+            return self.silence(frame_count), PA_COMPLETE
+        data = self.read(frame_count)
+        return data, PA_CONTINUE if self.position < self.total else PA_COMPLETE
+
+    def close(self):
+        pass
+
+
+class ImageSource(PlaybackSource):
+    """
+    PlaybackSource over an encoded image (ndarray or np.memmap), decoded in
+    blocks of `block_samples` with codec.decode_range. A read-ahead thread keeps
+    the block under the play position and the next `read_ahead` ones decoded and
+    drops the rest; a block it hasn't reached yet (just after a seek) is decoded
+    on the spot and counted in `misses`. Call close() to stop the thread.
+    """
+
+    def __init__(self, rgb, method, sample_count=None, block_samples=BLOCK_SAMPLES, read_ahead=READ_AHEAD):
+        self.rgb = rgb
+        self.method = normalize_method(method)
+        self.sample_count = sample_count
+        self.block_samples = block_samples
+        self.read_ahead = read_ahead
+        self.total = decoded_length(rgb.shape, self.method, sample_count)
+        self.position = 0
+        self.underruns = 0
+        self.misses = 0
+        self._silence = memoryview(bytes(FRAMES_PER_BUFFER * 2))
+        # Reads that straddle two blocks are joined here (handed out read-only, like the PCM)
+        self._scratch = bytearray(FRAMES_PER_BUFFER * 2)
+        self._scratch_view = memoryview(self._scratch).toreadonly()
+        self._blocks = {}  # Block index -> read-only bytes of its PCM
+        self._closed = False
+        self._wake = threading.Event()
+        self._wake.set()  # Decode the first blocks before playback starts
+        self._thread = threading.Thread(target=self._read_ahead_loop, name="playback-read-ahead", daemon=True)
+        self._thread.start()
+
+    def seek(self, position):
+        super().seek(position)
+        self._wake.set()
+
+    def read(self, frame_count):
+        start = self.position
+        end = min(start + frame_count, self.total)
+        self.position = end
+        index, offset = divmod(start, self.block_samples)
+        block = self._block(index)
+        if end - start <= self.block_samples - offset:
+            data = block[2 * offset:2 * (offset + end - start)]
+        else:
+            size = 2 * (end - start)
+            if len(self._scratch) < size:
+                self._scratch = bytearray(size)
+                self._scratch_view = memoryview(self._scratch).toreadonly()
+            filled = 0
+            while filled < size:
+                piece = block[2 * offset:2 * offset + size - filled]
+                self._scratch[filled:filled + len(piece)] = piece
+                filled += len(piece)
+                index, offset = index + 1, 0
+                if filled < size:
+                    block = self._block(index)
+            data = self._scratch_view[:size]
+        if end // self.block_samples != start // self.block_samples:
+            self._wake.set()
+        return data
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+
+    def _block(self, index):
+        block = self._blocks.get(index)
+        if block is None:
+            self.misses += 1
+            block = self._decode(index)
+        return block
+
+    def _decode(self, index):
+        start = index * self.block_samples
+        samples = decode_range(self.rgb, self.method, start, start + self.block_samples, self.sample_count)
+        samples.flags.writeable = False
+        block = memoryview(samples).cast('B')
+        self._blocks[index] = block
+        return block
+
+    def _read_ahead_loop(self):
+        last_block = max(0, self.total - 1) // self.block_samples
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                return
+            current = self.position // self.block_samples
+            wanted = range(current, min(current + self.read_ahead, last_block) + 1)
+            # list() copies the keys in one step; the audio thread may add a block on a miss
+            for index in list(self._blocks):
+                if index not in wanted:
+                    self._blocks.pop(index, None)
+            for index in wanted:
+                if self._closed or self._wake.is_set():
+                    break  # Seeked or moved on; start over from the new position
+                if index not in self._blocks:
+                    self._decode(index)
+
+
+class Player:
+    """
+    Plays a PlaybackSource on a PyAudio instance, either from the PortAudio
+    callback or, in "blocking" mode, by writing from a dedicated feeder thread.
+    """
+
+    def __init__(self, audio, source, mode=DEFAULT_MODE):
+        self.audio = audio
+        self.source = source
+        self.mode = mode
+        self._stream = None
+        self._feeder = None
+        self._stop = threading.Event()
+
+    def start(self):
+        blocking = self.mode == "blocking"
+        self._stream = self.audio.open(format=PA_INT16, channels=1, rate=SAMPLE_RATE, output=True,
+                                       frames_per_buffer=FRAMES_PER_BUFFER,
+                                       stream_callback=None if blocking else self.source.callback)
+        if blocking:
+            self._stop.clear()
+            self._feeder = threading.Thread(target=self._feed, name="playback-feeder", daemon=True)
+            self._feeder.start()
+
+    def _feed(self):
+        stream, source = self._stream, self.source
+        # Nothing queued yet, so this is the size of PortAudio's whole write buffer
+        capacity = stream.get_write_available()
+        started = False
+        while not self._stop.is_set() and not source.finished:
+            if started and stream.get_write_available() >= capacity:
+                source.underruns += 1
+            stream.write(source.read(FRAMES_PER_BUFFER))
+            started = True
+
+    @property
+    def active(self):
+        if self._stream is None:
+            return False
+        if self._feeder is not None:
+            return self._feeder.is_alive()
+        return self._stream.is_active()
+
+    def stop(self):
+        self._stop.set()
+        if self._feeder is not None:
+            self._feeder.join()
+            self._feeder = None
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
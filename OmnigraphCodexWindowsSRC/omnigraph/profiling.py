@@ -0,0 +1,110 @@
+"""
+Opt-in timing of pipeline stages (ffmpeg, PCM read, FFT, quantize, image
+build, PNG save, decode, preview build).
+
+Set OMNIGRAPH_PROFILE to a file path (or to "1" for omnigraph-profile.jsonl in
+the temp directory), or pass --profile PATH to the CLI, and every stage appends
+one JSON line: stage name, wall time, CPU time of the calling thread, bytes
+produced and any context such as the method. OMNIGRAPH_PROFILE_MEMORY=1 (or
+--profile-memory) adds the tracemalloc peak per stage; tracing slows every
+allocation, so it is off by default. With profiling disabled a stage costs one
+function call, so the instrumentation stays in place in release builds.
+"""
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ENV_VAR = "OMNIGRAPH_PROFILE"
+MEMORY_ENV_VAR = "OMNIGRAPH_PROFILE_MEMORY"
+DEFAULT_LOG = os.path.join(tempfile.gettempdir(), "omnigraph-profile.jsonl")
+
+_log_path = None
+_trace_memory = False
+_listeners = []
+_write_lock = threading.Lock()
+
+
+def enable(log_path=DEFAULT_LOG, memory=False):
+    """ Starts recording stages to `log_path` (None records for listeners only). """
+    global _log_path, _trace_memory
+    _log_path = log_path
+    _trace_memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global _log_path, _trace_memory
+    _log_path = None
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _trace_memory = False
+
+
+def enabled():
+    return _log_path is not None or bool(_listeners)
+
+
+def settings():
+    """ (log_path, memory) to hand to `enable` in a worker process. """
+    return _log_path, _trace_memory
+
+
+def add_listener(callback):
+    """ Calls `callback(record)` for each finished stage, from the thread that ran it. """
+    _listeners.append(callback)
+
+
+def remove_listener(callback):
+    _listeners.remove(callback)
+
+
+@contextlib.contextmanager
+def stage(name, **context):
+    """
+    Times the enclosed block as one stage. Yields the record so the block can
+    fill in "bytes" (or other fields) once it knows them.
+    """
+    if not enabled():
+        yield {}
+        return
+    record = {"stage": name, "bytes": 0, **context}
+    if _trace_memory:
+        tracemalloc.reset_peak()
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["wall_s"] = round(time.perf_counter() - wall, 6)
+        record["cpu_s"] = round(time.thread_time() - cpu, 6)
+        if _trace_memory:
+            record["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        record["time"] = time.time()
+        record["pid"] = os.getpid()
+        _emit(record)
+
+
+def _emit(record):
+    if _log_path is not None:
+        line = json.dumps(record, default=str) + "\n"
+        with _write_lock, open(_log_path, "a", encoding="utf-8") as log:
+            log.write(line)
+    for listener in list(_listeners):
+        listener(record)
+
+
+def _configure_from_env():
+    value = os.environ.get(ENV_VAR, "").strip()
+    if value and value != "0":
+        enable(DEFAULT_LOG if value == "1" else value,
+               memory=os.environ.get(MEMORY_ENV_VAR, "") not in ("", "0"))
+
+
+_configure_from_env()
@@ -0,0 +1,70 @@
+"""
+Multi-resolution tile pyramid for previewing large encoded images.
+
+Level 0 is the image itself (an ndarray or np.memmap, never copied); each
+further level halves both sides with a 2 x 2 box filter and is built the first
+time a zoomed-out view asks for it. Viewers draw fixed-size tiles from the
+coarsest level that still has at least one texel per screen pixel, so the work
+per frame depends on the window size rather than on the image size.
+"""
+import math
+
+import numpy as np
+
+TILE_SIZE = 256
+# Rows downsampled at a time, so a memory-mapped level 0 is streamed rather than loaded
+DOWNSAMPLE_BAND = 512
+
+
+def downsample(rgb_array, band_rows=DOWNSAMPLE_BAND):
+    """ Halves an (H, W, 3) uint8 image, rounding odd sides up by repeating the edge. """
+    height, width = rgb_array.shape[:2]
+    out = np.empty(((height + 1) // 2, (width + 1) // 2, 3), dtype=np.uint8)
+    band_rows += band_rows % 2
+    for top in range(0, height, band_rows):
+        band = rgb_array[top:top + band_rows]
+        if len(band) % 2 or width % 2:
+            band = np.pad(band, ((0, len(band) % 2), (0, width % 2), (0, 0)), mode='edge')
+        total = band[0::2, 0::2].astype(np.uint16)
+        total += band[1::2, 0::2]
+        total += band[0::2, 1::2]
+        total += band[1::2, 1::2]
+        total += 2  # Round to nearest
+        total >>= 2
+        out[top // 2:top // 2 + len(total)] = total
+    return out
+
+
+class ImagePyramid:
+    """ Lazily built mip levels of an RGB image, addressed in tiles of `tile_size`. """
+
+    def __init__(self, rgb_array, tile_size=TILE_SIZE):
+        self.height, self.width = rgb_array.shape[:2]
+        self.tile_size = tile_size
+        self.level_count = 1 + max(0, math.ceil(math.log2(max(self.height, self.width) / tile_size)))
+        self._levels = [rgb_array]
+
+    def level(self, index):
+        while len(self._levels) <= index:
+            self._levels.append(downsample(self._levels[-1]))
+        return self._levels[index]
+
+    def level_for_scale(self, scale):
+        """ Coarsest level with at least one texel per screen pixel at `scale` (screen px per image px). """
+        if scale >= 1:
+            return 0
+        return min(self.level_count - 1, int(math.floor(math.log2(1 / scale))))
+
+    def tile(self, index, column, row):
+        """ Pixels of one tile of a level (smaller at the right and bottom edges). """
+        size = self.tile_size
+        return self.level(index)[row * size:(row + 1) * size, column * size:(column + 1) * size]
+
+    def visible_tiles(self, index, left, top, right, bottom):
+        """ (column, row) of the level's tiles overlapping a rectangle in level-0 pixels. """
+        span = self.tile_size << index  # Level-0 pixels covered by one tile
+        first_column, first_row = max(0, int(left) // span), max(0, int(top) // span)
+        last_column = min(math.ceil(right / span), math.ceil(self.width / span))
+        last_row = min(math.ceil(bottom / span), math.ceil(self.height / span))
+        return [(column, row) for row in range(first_row, last_row)
+                for column in range(first_column, last_column)]
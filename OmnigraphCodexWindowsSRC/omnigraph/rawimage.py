@@ -0,0 +1,85 @@
+"""
+Uncompressed ".omniraw" container for encoded images.
+
+A 64-byte header (magic, format version, method, original sample count,
+height, width and, from version 2, sample rate and codec version) is followed by
+the raw H x W x 3 uint8 payload, so both sides can np.memmap the pixels instead
+of paying for zlib. PNG stays the sharing format.
+"""
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+from . import profiling
+from .codec import CODEC_VERSION, SAMPLE_RATE, CodecError, ImageInfo, check_info, normalize_method
+
+RAW_EXTENSION = ".omniraw"
+MAGIC = b"OMNIRAW\x00"
+FORMAT_VERSION = 2
+HEADER_SIZE = 64
+# magic, version, method, sample count, height, width, sample rate, codec version;
+# zero padded to HEADER_SIZE. Version 1 headers end after the width.
+_HEADER = struct.Struct("<8sHcxQIIIH")
+_HEADER_V1 = struct.Struct("<8sHcxQII")
+
+RawHeader = namedtuple("RawHeader", "method sample_count height width sample_rate codec_version",
+                       defaults=(SAMPLE_RATE, CODEC_VERSION))
+
+
+def is_raw_path(path):
+    return str(path).lower().endswith(RAW_EXTENSION)
+
+
+def _pack_header(header):
+    packed = _HEADER.pack(MAGIC, FORMAT_VERSION, header.method.encode("ascii"),
+                          header.sample_count, header.height, header.width,
+                          header.sample_rate, header.codec_version)
+    return packed.ljust(HEADER_SIZE, b"\x00")
+
+
+def read_header(path):
+    with open(path, "rb") as handle:
+        data = handle.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE or not data.startswith(MAGIC):
+        raise CodecError(f"{path} is not an Omnigraph raw image")
+    version = _HEADER_V1.unpack_from(data)[1]
+    if version > FORMAT_VERSION:
+        raise CodecError(f"{path} uses raw format version {version}, newer than this build supports")
+    if version == 1:
+        _, _, method, sample_count, height, width = _HEADER_V1.unpack_from(data)
+        return RawHeader(method.decode("ascii"), sample_count, height, width)
+    _, _, method, *fields = _HEADER.unpack_from(data)
+    return RawHeader(method.decode("ascii"), *fields)
+
+
+def header_info(header):
+    """ The header's decoding metadata as a validated codec.ImageInfo. """
+    return check_info(ImageInfo(header.method, header.sample_count, header.sample_rate,
+                                header.codec_version), (header.height, header.width))
+
+
+def create_raw(path, method, sample_count, height, width):
+    """ Writes the header and returns a writable memmap of the (zeroed) payload. """
+    header = RawHeader(normalize_method(method), int(sample_count), int(height), int(width))
+    with open(path, "wb") as handle:
+        handle.write(_pack_header(header))
+    return np.memmap(path, dtype=np.uint8, mode="r+", offset=HEADER_SIZE,
+                     shape=(header.height, header.width, 3))
+
+
+def open_raw(path, writable=False):
+    """ Returns (RawHeader, memmap of the H x W x 3 payload) without reading the pixels. """
+    header = read_header(path)
+    pixels = np.memmap(path, dtype=np.uint8, mode="r+" if writable else "r", offset=HEADER_SIZE,
+                       shape=(header.height, header.width, 3))
+    return header, pixels
+
+
+def save_raw(path, rgb_array, method, sample_count):
+    with profiling.stage("raw_save") as record:
+        canvas = create_raw(path, method, sample_count, rgb_array.shape[0], rgb_array.shape[1])
+        canvas[:] = rgb_array
+        canvas.flush()
+        record["bytes"] = canvas.nbytes
+        del canvas
@@ -0,0 +1,406 @@
+"""
+Local encode/decode service for asset pipelines:
+
+    omnigraph-codex serve [--host 127.0.0.1] [--port 8765] [--unix PATH] [-j WORKERS] [--max-queue N]
+                          [--output-root DIR]
+
+A small HTTP/1.1 server on asyncio, using only the standard library:
+
+    POST /encode?method=A[&format=png|raw][&stream=1][&name=clip.mp3]   body: audio file
+    POST /decode[?method=A][&max_duration=S|&duration=S][&name=image.png] body: image file
+    POST /encode?path=/in/clip.wav[&out=clip.png]                       (and /decode likewise)
+    GET  /metrics
+    GET  /health
+
+Jobs either upload the file as the request body or name a local `path`. The
+result is streamed back as the response body, or written to `out` when given,
+in which case the response is a JSON summary. `out` is resolved inside the
+--output-root directory and may not leave it; without an output root it is
+refused, so clients can't make the server write anywhere else. As in the CLI,
+decode only uses `method`, `max_duration` and `duration` (seconds) for images
+without Omnigraph metadata.
+
+CPU work runs in a process pool of `workers`; the event loop only moves bytes.
+At most `max_queue` jobs are admitted at once (uploading, waiting or running).
+Beyond that the server answers 503 with Retry-After instead of spooling the
+upload, so clients back off rather than piling files up on disk. Clients that
+send "Expect: 100-continue" (curl does for large bodies) are only asked for the
+body once their job is admitted.
+
+/metrics reports latency percentiles for the server's own stages (upload,
+queue_wait, send, and job_encode / job_decode for whole requests) next to the
+worker pipeline stages recorded through omnigraph.profiling (ffmpeg, fft, decode, ...).
+"""
+import asyncio
+import collections
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from . import cli, codec, images, profiling, rawimage
+from .codec import CodecError
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_QUEUE = 16
+MAX_UPLOAD = 4 << 30
+STREAM_CHUNK = 1 << 20
+# How long a rejected upload is read and discarded, so the client sees the error instead of a reset
+DISCARD_TIMEOUT = 5.0
+# Latencies kept per stage for the percentiles, and the span throughput is averaged over
+LATENCY_WINDOW = 1024
+THROUGHPUT_WINDOW = 60.0
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+CONTENT_TYPES = {".png": "image/png", ".wav": "audio/wav", rawimage.RAW_EXTENSION: "application/octet-stream"}
+# Upload signatures, for clients that don't pass ?name=
+AUDIO_SIGNATURES = ((b"RIFF", ".wav"), (b"fLaC", ".flac"), (b"OggS", ".ogg"))
+
+
+class HTTPError(Exception):
+    """ Raised while handling a request to answer with `status` and a JSON error. """
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def run_job(command, source, target, method, options):
+    """ Runs one CLI job in a pool worker and returns the profiling records of its stages. """
+    records = []
+    listener = records.append
+    profiling.add_listener(listener)
+    try:
+        job = cli.encode_job if command == "encode" else cli.decode_job
+        job(source, target, method, **options)
+    finally:
+        profiling.remove_listener(listener)
+    return records
+
+
+def percentile(ordered, fraction):
+    """ Nearest-rank percentile of an already sorted, non-empty list. """
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Metrics:
+    """ Job counters, per-stage latencies and recent throughput for /metrics. """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counts = collections.Counter()
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_WINDOW))
+        self.total_bytes = collections.Counter()
+        self._recent = collections.deque()  # (finish time, bytes in, bytes out)
+
+    def observe(self, stage, seconds):
+        self.latencies[stage].append(seconds)
+
+    def finished(self, bytes_in, bytes_out):
+        now = time.time()
+        self.counts["completed"] += 1
+        self.total_bytes["in"] += bytes_in
+        self.total_bytes["out"] += bytes_out
+        self._recent.append((now, bytes_in, bytes_out))
+        self._trim(now)
+
+    def _trim(self, now):
+        while self._recent and self._recent[0][0] < now - THROUGHPUT_WINDOW:
+            self._recent.popleft()
+
+    def snapshot(self):
+        now = time.time()
+        self._trim(now)
+        span = min(THROUGHPUT_WINDOW, max(now - self.started, 1e-9))
+        stages = {}
+        for stage, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            stages[stage] = {
+                "count": len(ordered), "mean_s": sum(ordered) / len(ordered),
+                "p50_s": percentile(ordered, 0.5), "p90_s": percentile(ordered, 0.9),
+                "p99_s": percentile(ordered, 0.99), "max_s": ordered[-1],
+            }
+        return {
+            "uptime_s": now - self.started,
+            "jobs": dict(self.counts),
+            "bytes": dict(self.total_bytes),
+            "throughput": {
+                "window_s": span,
+                "jobs_per_s": len(self._recent) / span,
+                "mb_in_per_s": sum(item[1] for item in self._recent) / 1e6 / span,
+                "mb_out_per_s": sum(item[2] for item in self._recent) / 1e6 / span,
+            },
+            "stages": stages,
+        }
+
+
+class JobServer:
+    """
+    Request handler for asyncio.start_server / start_unix_server. One request
+    per connection; `close()` shuts the process pool down.
+    """
+
+    def __init__(self, workers=None, max_queue=DEFAULT_MAX_QUEUE, max_upload=MAX_UPLOAD,
+                 png_settings=images.DEFAULT_PNG, output_root=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_queue = max(1, max_queue)
+        self.max_upload = max_upload
+        self.png_settings = png_settings
+        self.output_root = os.path.realpath(output_root) if output_root else None
+        self.pool = cli.worker_pool(self.workers)
+        self.slots = asyncio.Semaphore(self.workers)
+        self.admitted = 0
+        self.running = 0
+        self.metrics = Metrics()
+        self.scratch = tempfile.mkdtemp(prefix="omnigraph-server-")
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def metrics_document(self):
+        document = self.metrics.snapshot()
+        document["queue"] = {"admitted": self.admitted, "running": self.running,
+                             "waiting": self.admitted - self.running,
+                             "max_queue": self.max_queue, "workers": self.workers}
+        return document
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                verb, target, headers = await self._read_head(reader)
+                await self._route(verb, target, headers, reader, writer)
+            except HTTPError as e:
+                await self._respond(writer, e.status, {"error": str(e)}, e.headers)
+                await self._discard(reader)
+            except Exception as e:
+                self.metrics.counts["errors"] += 1
+                await self._respond(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+                await self._discard(reader)
+        except ConnectionError:
+            pass  # Client went away mid-request
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return request_line[0].upper(), request_line[1], headers
+
+    @staticmethod
+    async def _discard(reader):
+        try:
+            while await asyncio.wait_for(reader.read(STREAM_CHUNK), DISCARD_TIMEOUT):
+                pass
+        except asyncio.TimeoutError:
+            pass
+
+    async def _route(self, verb, target, headers, reader, writer):
+        url = urlsplit(target)
+        if url.path in ("/encode", "/decode"):
+            if verb != "POST":
+                raise HTTPError(405, f"Use POST for {url.path}")
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            await self._convert(url.path[1:], params, headers, reader, writer)
+        elif url.path in ("/metrics", "/health"):
+            if verb != "GET":
+                raise HTTPError(405, f"Use GET for {url.path}")
+            body = self.metrics_document() if url.path == "/metrics" else {"status": "ok"}
+            await self._respond(writer, 200, body)
+        else:
+            raise HTTPError(404, f"No such endpoint: {url.path}")
+
+    def _output_path(self, out):
+        """ Resolves ?out= inside the output root, refusing anything that leaves it. """
+        if self.output_root is None:
+            raise HTTPError(400, "?out= is disabled; start the server with --output-root")
+        target = os.path.realpath(os.path.join(self.output_root, out))
+        try:
+            inside = os.path.commonpath([self.output_root, target]) == self.output_root
+        except ValueError:  # Another drive on Windows
+            inside = False
+        if not inside or target == self.output_root:
+            raise HTTPError(400, f"?out= must name a file inside the output root: {out}")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        return target
+
+    async def _convert(self, command, params, headers, reader, writer):
+        try:
+            method = codec.normalize_method(params.get("method", "A"))
+            length = int(headers.get("content-length", 0))
+        except (CodecError, ValueError) as e:
+            raise HTTPError(400, str(e))
+        path, out = params.get("path"), params.get("out")
+        if path is None and length <= 0:
+            raise HTTPError(400, "Upload the file as the request body or pass ?path=")
+        if length > self.max_upload:
+            raise HTTPError(413, f"Uploads are limited to {self.max_upload} bytes")
+        if path is not None and not os.path.isfile(path):
+            raise HTTPError(404, f"No such file: {path}")
+        if out is not None:
+            out = self._output_path(out)
+        if self.admitted >= self.max_queue:
+            self.metrics.counts["rejected"] += 1
+            raise HTTPError(503, f"Queue is full ({self.max_queue} jobs)", {"Retry-After": "1"})
+
+        self.admitted += 1
+        self.metrics.counts["accepted"] += 1
+        job_dir = tempfile.mkdtemp(dir=self.scratch)
+        start = time.perf_counter()
+        try:
+            if path is None:
+                if headers.get("expect", "").lower() == "100-continue":
+                    writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                    await writer.drain()
+                path = await self._receive(reader, length, job_dir, command, params.get("name"))
+            if command == "encode":
+                suffix = rawimage.RAW_EXTENSION if params.get("format") == "raw" else ".png"
+                options = {"streaming": params.get("stream") == "1", "png_settings": self.png_settings}
+            else:
+                seconds = params.get("duration") or params.get("max_duration")
+                try:
+                    max_samples = int(float(seconds) * codec.SAMPLE_RATE) if seconds else None
+                except ValueError:
+                    raise HTTPError(400, f"Not a duration: {seconds}")
+                suffix = ".wav"
+                options = {"max_samples": max_samples, "stretch": "duration" in params}
+            target = out or os.path.join(job_dir, "output" + suffix)
+
+            queued = time.perf_counter()
+            async with self.slots:
+                self.metrics.observe("queue_wait", time.perf_counter() - queued)
+                self.running += 1
+                try:
+                    records = await asyncio.get_running_loop().run_in_executor(
+                        self.pool, run_job, command, path, target, method, options)
+                except (CodecError, OSError, ValueError) as e:
+                    self.metrics.counts["failed"] += 1
+                    raise HTTPError(422, str(e))
+                finally:
+                    self.running -= 1
+            for record in records:
+                self.metrics.observe(record["stage"], record["wall_s"])
+
+            size_in, size_out = os.path.getsize(path), os.path.getsize(target)
+            if out:
+                await self._respond(writer, 200, {"output": out, "bytes": size_out,
+                                                  "seconds": time.perf_counter() - start})
+            else:
+                await self._send_file(writer, target)
+            # Not under `command`: codec.decode reports a worker stage named "decode" too
+            self.metrics.observe("job_" + command, time.perf_counter() - start)
+            self.metrics.finished(size_in, size_out)
+        finally:
+            self.admitted -= 1
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    async def _receive(self, reader, length, job_dir, command, name):
+        """ Spools the request body to the job directory and returns its path. """
+        start = time.perf_counter()
+        first = await reader.read(min(length, STREAM_CHUNK))
+        path = os.path.join(job_dir, "input" + self._upload_suffix(command, name, first))
+        remaining = length - len(first)
+        with open(path, "wb") as handle:
+            handle.write(first)
+            while remaining > 0:
+                chunk = await reader.read(min(remaining, STREAM_CHUNK))
+                if not chunk:
+                    raise HTTPError(400, "Upload ended before Content-Length bytes")
+                handle.write(chunk)
+                remaining -= len(chunk)
+        self.metrics.observe("upload", time.perf_counter() - start)
+        return path
+
+    @staticmethod
+    def _upload_suffix(command, name, head):
+        """ Extension the CLI jobs use to pick a reader; ffmpeg and PIL sniff the rest. """
+        if name and os.path.splitext(name)[1]:
+            return os.path.splitext(name)[1].lower()
+        if command == "decode":
+            return rawimage.RAW_EXTENSION if head.startswith(rawimage.MAGIC) else ".png"
+        for signature, suffix in AUDIO_SIGNATURES:
+            if head.startswith(signature):
+                return suffix
+        return ".bin"
+
+    async def _respond(self, writer, status, body, headers=None):
+        data = json.dumps(body, indent=1).encode("utf-8")
+        self._write_head(writer, status, "application/json", len(data), headers)
+        writer.write(data)
+        await writer.drain()
+
+    async def _send_file(self, writer, path):
+        """ Streams a result file back in STREAM_CHUNK pieces, waiting on slow readers. """
+        start = time.perf_counter()
+        size = os.path.getsize(path)
+        content_type = CONTENT_TYPES.get(os.path.splitext(path)[1], "application/octet-stream")
+        self._write_head(writer, 200, content_type, size)
+        with open(path, "rb") as handle:
+            while True:
+                chunk = handle.read(STREAM_CHUNK)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+        self.metrics.observe("send", time.perf_counter() - start)
+
+    @staticmethod
+    def _write_head(writer, status, content_type, length, headers=None):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                 f"Content-Type: {content_type}", f"Content-Length: {length}", "Connection: close"]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+
+async def _serve_forever(server, host, port, unix_path, output):
+    if unix_path:
+        listener = await asyncio.start_unix_server(server.handle, path=unix_path)
+        where = unix_path
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+        where = "http://{}:{}".format(*listener.sockets[0].getsockname()[:2])
+    print(f"Serving on {where} ({server.workers} worker(s), queue of {server.max_queue})",
+          file=output, flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, workers=None,
+          max_queue=DEFAULT_MAX_QUEUE, png_settings=images.DEFAULT_PNG, output=sys.stdout,
+          output_root=None):
+    """ Runs the server until interrupted; ?out= writes are confined to `output_root`. """
+    if unix_path and not hasattr(asyncio, "start_unix_server"):
+        raise CodecError("Unix sockets are not available on this platform.")
+
+    async def main():
+        server = JobServer(workers, max_queue, png_settings=png_settings, output_root=output_root)
+        try:
+            await _serve_forever(server, host, port, unix_path, output)
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if unix_path and os.path.exists(unix_path):
+            os.remove(unix_path)
+    return 0
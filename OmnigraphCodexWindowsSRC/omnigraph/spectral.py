@@ -0,0 +1,99 @@
+"""
+FFT backend and band splitting for Method C.
+
+scipy.fft is used when it is installed, threaded through `workers=`; otherwise
+numpy.fft. Both transform float32 input in single precision (NumPy >= 2), which
+halves the memory traffic of the float64 path. SciPy is imported on first use.
+"""
+import math
+import os
+
+import numpy as np
+
+# Threads per transform (scipy.fft only). Override with OMNIGRAPH_FFT_WORKERS.
+FFT_WORKERS = int(os.environ.get("OMNIGRAPH_FFT_WORKERS", str(os.cpu_count() or 1)))
+
+_fft_module = None
+
+
+def backend():
+    """ The FFT module in use: scipy.fft when importable, else numpy.fft. """
+    global _fft_module
+    if _fft_module is None:
+        try:
+            import scipy.fft as fft_module
+        except ImportError:
+            fft_module = np.fft
+        _fft_module = fft_module
+    return _fft_module
+
+
+def set_workers(count):
+    """ Sets the threads per transform, e.g. to 1 inside a process pool. """
+    global FFT_WORKERS
+    FFT_WORKERS = max(1, int(count))
+
+
+def rfft(signal, n=None, axis=-1):
+    fft = backend()
+    if fft is np.fft:
+        return fft.rfft(signal, n=n, axis=axis)
+    return fft.rfft(signal, n=n, axis=axis, workers=FFT_WORKERS)
+
+
+def irfft(spectrum, n=None, axis=-1):
+    fft = backend()
+    if fft is np.fft:
+        return fft.irfft(spectrum, n=n, axis=axis)
+    return fft.irfft(spectrum, n=n, axis=axis, workers=FFT_WORKERS)
+
+
+def next_fast_length(count):
+    """
+    Smallest length >= `count` whose only prime factors are 2, 3 and 5. Prime or
+    near-prime lengths force a Bluestein transform that is many times slower.
+    """
+    fft = backend()
+    if fft is not np.fft:
+        return fft.next_fast_len(count, real=True)
+    if count <= 6:
+        return max(1, count)
+    best = 1 << (count - 1).bit_length()
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            # Smallest power of two that lifts power35 to at least count
+            candidate = (1 << (math.ceil(count / power35) - 1).bit_length()) * power35
+            if candidate == count:
+                return count
+            best = min(best, candidate)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+def split_bands(signal, sample_rate, cutoffs, pad=True):
+    """
+    Splits a float signal at the `cutoffs` (Hz, ascending) into len(cutoffs) + 1
+    float32 bands of the same length, with one forward and one batched inverse
+    transform. The 0/1 band masks are applied as bin ranges, and the top band is
+    the residual, which equals its masked inverse transform by linearity. With
+    `pad`, the transform runs at `next_fast_length` and is trimmed back.
+    """
+    signal = np.asarray(signal, dtype=np.float32)
+    count = len(signal)
+    length = next_fast_length(count) if pad else count
+    spectrum = rfft(signal, n=length)
+    edges = [0] + [int(cutoff * length / sample_rate) for cutoff in cutoffs]
+
+    masked = np.zeros((len(cutoffs), len(spectrum)), dtype=spectrum.dtype)
+    for band, (lo, hi) in enumerate(zip(edges[:-1], edges[1:])):
+        masked[band, lo:hi] = spectrum[lo:hi]
+    del spectrum
+
+    bands = np.empty((len(cutoffs) + 1, count), dtype=np.float32)
+    bands[:-1] = irfft(masked, n=length)[:, :count]
+    del masked
+    np.subtract(signal, bands[:-1].sum(axis=0), out=bands[-1])
+    return bands
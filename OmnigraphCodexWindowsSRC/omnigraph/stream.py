@@ -0,0 +1,257 @@
+"""
+Bounded-memory encoding for very long recordings.
+
+PCM is read in fixed-size blocks and each block is quantized and written
+straight into its pixels of the output array, which may be an np.memmap so the
+image never has to fit in RAM either. Method C replaces the whole-signal FFT
+with an overlap-add STFT band split, so its output differs slightly from
+codec.encode near the band edges.
+"""
+import tempfile
+import wave
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import images, pcm, profiling, rawimage, spectral
+from .codec import (
+    SAMPLE_RATE, LOW_CUTOFF, MID_CUTOFF, CodecError, ImageInfo,
+    normalize_method, int16_to_uint8, band_to_uint8, image_side,
+)
+
+BLOCK_SAMPLES = 1 << 18
+
+# Method C STFT: periodic Hann frames at 50% overlap sum to exactly one
+STFT_FRAME = 4096
+STFT_HOP = STFT_FRAME // 2
+
+
+def _native_wav_params(audio_path):
+    """ (channels, sample width, frames) for WAVs that can be streamed without ffmpeg. """
+    if not audio_path.lower().endswith('.wav'):
+        return None
+    try:
+        with wave.open(audio_path, 'rb') as wav_file:
+            if wav_file.getframerate() != SAMPLE_RATE or wav_file.getsampwidth() not in (1, 2, 3, 4):
+                return None
+            return wav_file.getnchannels(), wav_file.getsampwidth(), wav_file.getnframes()
+    except (wave.Error, EOFError):
+        return None
+
+
+def _read_exactly(stream, view):
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+def iter_pcm_blocks(audio_path, block_samples=BLOCK_SAMPLES):
+    """
+    Yields mono 44.1 kHz int16 blocks of up to `block_samples` samples. Blocks
+    may share one reused buffer, so copy anything that must outlive the next block.
+    """
+    params = _native_wav_params(audio_path)
+    if params is not None:
+        channels, sample_width, _ = params
+        with wave.open(audio_path, 'rb') as wav_file:
+            while True:
+                raw_data = wav_file.readframes(block_samples)
+                if not raw_data:
+                    return
+                samples = pcm._pcm_bytes_to_int16(raw_data, sample_width)
+                yield pcm.to_mono_44k(samples, channels, SAMPLE_RATE)
+
+    buffer = bytearray(block_samples * 2)
+    view = memoryview(buffer)
+    with pcm.ffmpeg_pipe(audio_path) as stdout:
+        while True:
+            filled = _read_exactly(stdout, view)
+            if filled < 2:
+                break
+            yield np.frombuffer(buffer, dtype=np.int16, count=filled // 2)
+            if filled < len(buffer):
+                break
+        # Drain to EOF so ffmpeg exits cleanly
+        while _read_exactly(stdout, view):
+            pass
+
+
+def count_samples(audio_path, block_samples=BLOCK_SAMPLES):
+    """ Total mono 44.1 kHz sample count, from the WAV header or a counting pass. """
+    params = _native_wav_params(audio_path)
+    if params is not None:
+        return params[2]
+    return sum(len(block) for block in iter_pcm_blocks(audio_path, block_samples))
+
+
+class StreamEncoder:
+    """
+    Incremental Method A/B/C encoder. The total sample count fixes the image
+    side up front; blocks are then fed in order and written into `out`.
+    """
+
+    def __init__(self, total_samples, method, out=None):
+        if total_samples <= 0:
+            raise CodecError("No PCM samples were provided.")
+        self.method = normalize_method(method)
+        self.total = total_samples
+        self.position = 0
+
+        if self.method == "A":
+            split_points = [total_samples // 3, 2 * total_samples // 3]
+            self._starts = [0, split_points[0], split_points[1]]
+            self._ends = [split_points[0], split_points[1], total_samples]
+            side = image_side(max(end - start for start, end in zip(self._starts, self._ends)))
+        elif self.method == "B":
+            self.total = total_samples - total_samples % 3
+            self._carry = np.empty(0, dtype=np.int16)
+            self._next_pixel = 0
+            side = image_side(self.total // 3)
+        else:
+            side = image_side(total_samples)
+            self._window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(STFT_FRAME) / STFT_FRAME)).astype(np.float32)
+            k_low = int(LOW_CUTOFF * STFT_FRAME / SAMPLE_RATE)
+            k_mid = int(MID_CUTOFF * STFT_FRAME / SAMPLE_RATE)
+            self._masks = np.zeros((3, STFT_FRAME // 2 + 1), dtype=np.float32)
+            self._masks[0, :k_low] = 1.0
+            self._masks[1, k_low:k_mid] = 1.0
+            self._masks[2, k_mid:] = 1.0
+            # Leading hop of silence so the first samples are covered by two frames
+            self._pending = np.zeros(STFT_HOP, dtype=np.float32)
+            self._tail = np.zeros((3, STFT_HOP), dtype=np.float32)
+            self._skip = STFT_HOP
+            self._emitted = 0
+
+        self.side = side
+        if out is None:
+            out = np.zeros((side, side, 3), dtype=np.uint8)
+        elif out.shape != (side, side, 3) or out.dtype != np.uint8:
+            raise CodecError(f"Output buffer must be ({side}, {side}, 3) uint8, got {out.shape} {out.dtype}")
+        self.out = out
+        self._pixels = out.reshape(-1, 3)
+
+    def feed(self, block):
+        block = block[:max(0, self.total - self.position)]
+        if not len(block):
+            return
+        if self.method == "A":
+            self._feed_a(block)
+        elif self.method == "B":
+            self._feed_b(block)
+        else:
+            self._feed_c(block)
+        self.position += len(block)
+
+    def finish(self):
+        """ Flushes buffered samples and returns the filled image array. """
+        if self.method == "C":
+            self._pending = np.concatenate([self._pending, np.zeros(STFT_FRAME, dtype=np.float32)])
+            self._run_frames()
+        if isinstance(self.out, np.memmap):
+            self.out.flush()
+        return self.out
+
+    def _feed_a(self, block):
+        start = self.position
+        for channel in range(3):
+            lo = max(start, self._starts[channel])
+            hi = min(start + len(block), self._ends[channel])
+            if lo < hi:
+                offset = self._starts[channel]
+                int16_to_uint8(block[lo - start:hi - start], out=self._pixels[lo - offset:hi - offset, channel])
+
+    def _feed_b(self, block):
+        if len(self._carry):
+            block = np.concatenate([self._carry, block])
+        usable = len(block) - len(block) % 3
+        self._carry = block[usable:].copy()
+        samples = block[:usable].reshape(-1, 3)
+        pixels = self._pixels[self._next_pixel:self._next_pixel + len(samples)]
+        for channel, source in enumerate((0, 2, 1)):
+            int16_to_uint8(samples[:, source], out=pixels[:, channel])
+        self._next_pixel += len(samples)
+
+    def _feed_c(self, block):
+        self._pending = np.concatenate([self._pending, block.astype(np.float32) / 32768.0])
+        self._run_frames()
+
+    def _run_frames(self):
+        """
+        Runs every complete STFT frame in the pending input at once and writes the
+        band samples that no later frame contributes to.
+        """
+        frame_count = (len(self._pending) - STFT_FRAME) // STFT_HOP + 1
+        if frame_count <= 0:
+            return
+        frames = sliding_window_view(self._pending, STFT_FRAME)[::STFT_HOP][:frame_count]
+        spectra = spectral.rfft(frames * self._window, axis=-1)
+        bands = spectral.irfft(spectra[:, None, :] * self._masks, n=STFT_FRAME, axis=-1)
+
+        # With 50% overlap each hop is the head of one frame plus the tail of the previous one
+        segments = bands[:, :, :STFT_HOP].copy()
+        segments[0] += self._tail
+        segments[1:] += bands[:-1, :, STFT_HOP:]
+        self._tail = bands[-1, :, STFT_HOP:].copy()
+        self._pending = self._pending[frame_count * STFT_HOP:].copy()
+
+        signal = segments.transpose(1, 0, 2).reshape(3, -1)[:, self._skip:]
+        self._skip = max(0, self._skip - frame_count * STFT_HOP)
+        count = min(signal.shape[1], self.total - self._emitted)
+        for channel in range(3):
+            band_to_uint8(signal[channel, :count], out=self._pixels[self._emitted:self._emitted + count, channel])
+        self._emitted += count
+
+
+def encode_file_streaming(audio_path, method, out=None, block_samples=BLOCK_SAMPLES, total_samples=None):
+    """
+    Encodes an audio file block by block. Pass an np.memmap as `out` (see
+    `StreamEncoder.side` / `stream_image_side`) to keep peak memory flat.
+    """
+    if total_samples is None:
+        total_samples = count_samples(audio_path, block_samples)
+    encoder = StreamEncoder(total_samples, method, out)
+    with profiling.stage("stream_encode", method=encoder.method) as record:
+        for block in iter_pcm_blocks(audio_path, block_samples):
+            encoder.feed(block)
+        rgb_array = encoder.finish()
+        record["bytes"] = 2 * total_samples
+    return rgb_array
+
+
+def stream_image_side(total_samples, method):
+    """ Side of the square image `StreamEncoder` produces for `total_samples`. """
+    method = normalize_method(method)
+    if method == "A":
+        return image_side(total_samples - 2 * total_samples // 3)
+    if method == "B":
+        return image_side(total_samples // 3)
+    return image_side(total_samples)
+
+
+def encode_file_to_png(audio_path, image_path, method, block_samples=BLOCK_SAMPLES,
+                       png_settings=images.DEFAULT_PNG):
+    """
+    Streams an audio file into a PNG with memory bounded by `block_samples`:
+    pixels go to a memory-mapped scratch file that is then compressed row by row.
+    """
+    total = count_samples(audio_path, block_samples)
+    side = stream_image_side(total, method)
+    with tempfile.TemporaryFile() as scratch:
+        canvas = np.memmap(scratch, dtype=np.uint8, mode='w+', shape=(side, side, 3))
+        encode_file_streaming(audio_path, method, canvas, block_samples, total)
+        images.write_png_rows(canvas, image_path, png_settings,
+                              info=ImageInfo(normalize_method(method), total))
+        del canvas
+
+
+def encode_file_to_raw(audio_path, raw_path, method, block_samples=BLOCK_SAMPLES):
+    """ Streams an audio file straight into a memory-mapped .omniraw image. """
+    total = count_samples(audio_path, block_samples)
+    side = stream_image_side(total, method)
+    canvas = rawimage.create_raw(raw_path, method, total, side, side)
+    encode_file_streaming(audio_path, method, canvas, block_samples, total)
+    del canvas
@@ -1,20 +1,49 @@
 import sys
 import os
-import numpy as np
-import tempfile
-import subprocess
 import ctypes
+import gc
+import importlib.util
+import threading
+from collections import OrderedDict
+from functools import partial
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QLabel, QFileDialog, QVBoxLayout, QWidget,
     QGraphicsView, QGraphicsScene, QHBoxLayout, QMessageBox, QComboBox, QSlider, QStyle, QStyleOptionSlider,
-    QDialog, QTextBrowser
+    QDialog, QTextBrowser, QFormLayout, QSpinBox, QCheckBox, QDialogButtonBox, QGraphicsItem
 )
-from PyQt5.QtGui import QPixmap, QPainter, QColor, QBrush, QCursor, QIcon, QDesktopServices
-from PyQt5.QtCore import Qt, QRectF, QTimer, QPointF, QUrl
-from PIL import Image
-import wave
-import pyaudio
-import io
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QBrush, QCursor, QIcon, QDesktopServices, QPen
+from PyQt5.QtCore import Qt, QRectF, QTimer, QPointF, QUrl, pyqtSignal, QObject, QRunnable, QThreadPool
+
+from omnigraph import profiling
+
+
+def lazy_import(name):
+    """
+    Returns module `name`, deferring its execution to the first attribute access
+    so that NumPy, PIL and the codec load on the first encode or decode rather
+    than before the window appears. Lazy modules are listed in hiddenimports in
+    omnigraph_codex.spec, since PyInstaller can't see them.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+np = lazy_import("numpy")
+cache = lazy_import("omnigraph.cache")
+codec = lazy_import("omnigraph.codec")
+images = lazy_import("omnigraph.images")
+jobs = lazy_import("omnigraph.jobs")
+pcm = lazy_import("omnigraph.pcm")
+playback = lazy_import("omnigraph.playback")
+pyramid = lazy_import("omnigraph.pyramid")
+rawimage = lazy_import("omnigraph.rawimage")
 
 # Function to get the correct resource path (works for both .py and .exe)
 def resource_path(relative_path):
@@ -26,6 +55,61 @@ def resource_path(relative_path):
 # Define the resource path dynamically
 RESOURCE_PATH = resource_path("Resources")
 MOBILE_URL = "https://github.com/omjimmy10/OmnigraphCodex/tree/main"
+# Default length limit for photos opened with "Open Image" (0 plays them in full)
+PHOTO_SECONDS = int(os.environ.get("OMNIGRAPH_PHOTO_SECONDS", "0") or 0)
+
+
+def rgb_array_to_qimage(rgb_array):
+    """
+    Wraps an (H, W, 3) uint8 array in a QImage that reads the array's memory
+    directly, with no PNG round trip. The array is kept alive on the QImage.
+    """
+    rgb_array = np.ascontiguousarray(rgb_array)
+    height, width = rgb_array.shape[:2]
+    image = QImage(rgb_array.data, width, height, width * 3, QImage.Format_RGB888)
+    image.rgb_array = rgb_array
+    return image
+
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(str, int)  # stage, percent (-1 when unknown)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class CodecWorker(QRunnable):
+    """
+    Runs an omnigraph job on QThreadPool. The job's progress callback emits
+    progress signals and raises Cancelled once cancel() has been called; the
+    outcome comes back to the GUI thread through the signals.
+    """
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+        self.signals = WorkerSignals()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def report(self, stage, fraction):
+        if self._cancel.is_set():
+            raise codec.Cancelled()
+        self.signals.progress.emit(stage, -1 if fraction is None else int(fraction * 100))
+
+    def run(self):
+        try:
+            result = self.job(progress=self.report)
+        except codec.Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            if self._cancel.is_set():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
 
 
 class ClickableSlider(QSlider):
@@ -48,9 +132,13 @@ class ClickableSlider(QSlider):
 
 
 class ZoomableGraphicsView(QGraphicsView):
+    # Shift+drag draws a rubber band instead of panning; emits the rectangle in scene coordinates
+    region_selected = pyqtSignal(QRectF)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self._zoom = 0
+        self._selection_start = None
         self.setRenderHint(QPainter.Antialiasing)
         self.setRenderHint(QPainter.SmoothPixmapTransform)
         self.setDragMode(QGraphicsView.ScrollHandDrag)
@@ -66,8 +154,165 @@ class ZoomableGraphicsView(QGraphicsView):
             self.scale(1/zoom_factor, 1/zoom_factor)
             self._zoom -= 1
 
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton and event.modifiers() & Qt.ShiftModifier:
+            self._selection_start = self.mapToScene(event.pos())
+            self.setDragMode(QGraphicsView.RubberBandDrag)
+        super().mousePressEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        super().mouseReleaseEvent(event)
+        if self._selection_start is not None and event.button() == Qt.LeftButton:
+            rect = QRectF(self._selection_start, self.mapToScene(event.pos())).normalized()
+            self._selection_start = None
+            self.setDragMode(QGraphicsView.ScrollHandDrag)
+            self.region_selected.emit(rect)
+
+
+class TiledPreviewItem(QGraphicsItem):
+    """
+    Draws an encoded image from an omnigraph.pyramid.ImagePyramid: only the
+    tiles in the exposed area, from the mip level matching the current zoom.
+    Tile pixmaps are kept in an LRU cache of at most MAX_TILES entries, so
+    pixmap memory stays bounded however large the image is.
+    """
+    MAX_TILES = 256
+
+    def __init__(self, rgb_array):
+        super().__init__()
+        self.pyramid = pyramid.ImagePyramid(rgb_array)
+        self.tiles = OrderedDict()
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.pyramid.width, self.pyramid.height)
+
+    def tile_pixmap(self, level, column, row):
+        key = (level, column, row)
+        pixmap = self.tiles.get(key)
+        if pixmap is None:
+            pixmap = QPixmap.fromImage(rgb_array_to_qimage(self.pyramid.tile(level, column, row)))
+            self.tiles[key] = pixmap
+            if len(self.tiles) > self.MAX_TILES:
+                self.tiles.popitem(last=False)
+        else:
+            self.tiles.move_to_end(key)
+        return pixmap
+
+    def paint(self, painter, option, widget=None):
+        scale = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.pyramid.level_for_scale(scale)
+        area = option.exposedRect.intersected(self.boundingRect())
+        painter.setRenderHint(QPainter.Antialiasing, False)  # Would blend seams between tiles
+        texel = 1 << level  # Level-0 pixels per texel of this level
+        span = self.pyramid.tile_size * texel
+        for column, row in self.pyramid.visible_tiles(level, area.left(), area.top(),
+                                                      area.right(), area.bottom()):
+            pixmap = self.tile_pixmap(level, column, row)
+            left, top = column * span, row * span
+            # Edge tiles of coarse levels may overhang the image by less than a texel
+            width = min(pixmap.width() * texel, self.pyramid.width - left)
+            height = min(pixmap.height() * texel, self.pyramid.height - top)
+            painter.drawPixmap(QRectF(left, top, width, height), pixmap,
+                               QRectF(0, 0, width / texel, height / texel))
+
+
+class PlaybackHeatmap(QGraphicsItem):
+    """
+    Overlay marking the pixels playback has passed through, brighter the more
+    often they were played. It is one QImage over a NumPy buffer; marking pixels
+    repaints just the rows they span. Large previews get a coarser overlay
+    (at most MAX_SIDE per side) scaled up to cover the image.
+    """
+    MAX_SIDE = 2048
+    HEAT_STEP = 48
+    MAX_ALPHA = 192
+
+    def __init__(self, image_width, image_height, color=(38, 255, 126)):
+        super().__init__()
+        self.factor = max(1, -(-max(image_width, image_height) // self.MAX_SIDE))
+        self.image_width = image_width
+        self.width = -(-image_width // self.factor)
+        self.height = -(-image_height // self.factor)
+        # Premultiplied ARGB32 is B, G, R, A in memory on little-endian machines
+        self.pixels = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        self.color = np.array(color[::-1], dtype=np.uint16)
+        self.image = QImage(self.pixels.data, self.width, self.height, self.width * 4,
+                            QImage.Format_ARGB32_Premultiplied)
+        self.setScale(self.factor)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.width, self.height)
+
+    def paint(self, painter, option, widget=None):
+        rect = option.exposedRect
+        painter.drawImage(rect, self.image, rect)
+
+    def mark(self, pixel_indices):
+        rows, cols = np.divmod(np.asarray(pixel_indices), self.image_width)
+        rows //= self.factor
+        cols //= self.factor
+        texels = self.pixels[rows, cols]
+        alpha = np.minimum(texels[:, 3].astype(np.uint16) + self.HEAT_STEP, self.MAX_ALPHA)
+        texels[:, :3] = self.color * alpha[:, None] // 255
+        texels[:, 3] = alpha
+        self.pixels[rows, cols] = texels
+        top = int(rows.min())
+        self.update(QRectF(0, top, self.width, int(rows.max()) - top + 1))
+
+
+class ExportSettingsDialog(QDialog):
+    """
+    PNG export settings: zlib level, zlib strategy and PIL's optimize search.
+    """
+    def __init__(self, settings, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("PNG Export Settings")
+        self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
+
+        layout = QFormLayout(self)
+        self.level_spin = QSpinBox()
+        self.level_spin.setRange(0, 9)
+        self.level_spin.setValue(settings.compress_level)
+        self.level_spin.setToolTip("0 = no compression (fastest), 9 = smallest file (slowest)")
+        layout.addRow("Compression level:", self.level_spin)
+
+        self.strategy_combo = QComboBox()
+        self.strategy_combo.addItems(list(images.PNG_STRATEGIES))
+        self.strategy_combo.setCurrentText(settings.strategy)
+        layout.addRow("Strategy:", self.strategy_combo)
+
+        self.optimize_check = QCheckBox("Optimize (much slower)")
+        self.optimize_check.setChecked(settings.optimize)
+        layout.addRow(self.optimize_check)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def settings(self):
+        return images.PngSettings(self.level_spin.value(), self.strategy_combo.currentText(),
+                                  self.optimize_check.isChecked())
+
+
+def locate_in_region(pixels, channels, positions):
+    """ sample_locations for a selection, looked up in codec.region_locations. """
+    positions = np.clip(positions, 0, len(pixels) - 1)
+    return pixels[positions], channels[positions]
+
+
+# Visualizer cursor colour per Method A plane
+CHANNEL_COLORS = {0: QColor(255, 0, 0, 200), 1: QColor(0, 255, 0, 200), 2: QColor(0, 0, 255, 200)}
+
 
 class AudioToImageConverter(QMainWindow):
+    # Emitted from the PNG writer thread: (saved path, error message or "")
+    export_finished = pyqtSignal(str, str)
+    # Emitted from whichever thread ran a profiled stage (OMNIGRAPH_PROFILE)
+    stage_finished = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
 
@@ -80,11 +325,8 @@ class AudioToImageConverter(QMainWindow):
         self.timer = QTimer()  # Timer for visualizer updates
         self.timer.timeout.connect(self.update_visualizer)
 
-        try:
-            self.p = pyaudio.PyAudio()
-        except Exception as e:
-            QMessageBox.critical(self, "Audio Error", f"Failed to initialize audio: {str(e)}")
-            sys.exit(1)
+        # PortAudio enumerates every device when it starts, so it waits for the first playback
+        self.p = None
 
 
         # Enable drag and drop on the main window (this drop area works near the buttons)
@@ -94,6 +336,26 @@ class AudioToImageConverter(QMainWindow):
         self.dark_mode = True  # The refreshed UI uses the OmnigraphCodex dark theme by default
         self.dragging_slider = False
         
+        # Callable yielding the opened image's PCM in blocks, for "Save Output"
+        self.decoded_blocks = None
+        # The previewed image as a jobs.ImageResult, and how to play all of it again
+        self.image_source = None
+        self.restore_playback = None
+        # Shift+drag selection: (top, left, height, width), its PCM and its outline in the scene
+        self.selection = None
+        self.selection_audio = None
+        self.selection_item = None
+        # PCM (or image blocks), play position and underruns shared with the audio thread, and the open stream
+        self.playback_source = None
+        self.player = None
+        # Sample position -> (pixel, channel) for the image being played, built once per load
+        self.locate_sample = None
+        self.playback_method = None
+        self.image_size = (0, 0)
+        self.heatmap = None
+        self.last_position = None
+        self.cursor_location = None
+
         # Variables to store the last file dropped or selected.
         self.last_audio_file = None
         self.last_image_file = None
@@ -101,6 +363,24 @@ class AudioToImageConverter(QMainWindow):
         
         self.encoding_method = "A"  # âœ… Initialize default encoding method
 
+        # PNG export settings and the thread that writes large exports
+        self.png_settings = None  # images.DEFAULT_PNG until changed in Export Settings
+        self.png_writer = None
+        self.export_finished.connect(self.on_export_finished)
+
+        # With OMNIGRAPH_PROFILE set, each pipeline stage is also shown in the status bar
+        self.profile_listener = None
+        if profiling.enabled():
+            self.stage_finished.connect(self.on_stage_finished)
+            self.profile_listener = self.stage_finished.emit
+            profiling.add_listener(self.profile_listener)
+
+        # Encode/decode jobs run on QThreadPool; only the newest one reports back
+        self.current_worker = None
+        self.running_workers = set()
+        # Per-source, per-method results so switching methods doesn't re-run ffmpeg
+        self.result_cache = None
+
         # Set App Icon
         icon_path = os.path.join(RESOURCE_PATH, "Logo_Omnigraph.png")
         if os.path.exists(icon_path):
@@ -135,6 +415,16 @@ class AudioToImageConverter(QMainWindow):
         self.method_combo.currentIndexChanged.connect(self.update_encoding_method)
         top_bar_layout.addWidget(self.method_combo)
 
+        # Photos (images without Omnigraph metadata) longer than this are shrunk and resampled
+        self.photo_limit_spin = QSpinBox()
+        self.photo_limit_spin.setRange(0, 3600)
+        self.photo_limit_spin.setSuffix(" s")
+        self.photo_limit_spin.setSpecialValueText("Full length")
+        self.photo_limit_spin.setValue(PHOTO_SECONDS)
+        self.photo_limit_spin.setToolTip("Longest audio a photo may decode to; larger photos are "
+                                         "shrunk and resampled to fit")
+        top_bar_layout.addWidget(self.photo_limit_spin)
+
         # Mobile link button, kept in the original top-right button position.
         self.dark_mode_btn = QPushButton("OmnigraphCodex for Mobile")
         self.dark_mode_btn.clicked.connect(self.open_mobile_link)
@@ -148,6 +438,7 @@ class AudioToImageConverter(QMainWindow):
         self.scene.setBackgroundBrush(QBrush(QColor("#03070D")))
         self.graphics_view.setScene(self.scene)
         self.graphics_view.setMinimumSize(400, 400)
+        self.graphics_view.region_selected.connect(self.select_region)
         main_layout.addWidget(self.graphics_view)
 
         # **Bottom Control Buttons**
@@ -164,15 +455,29 @@ class AudioToImageConverter(QMainWindow):
         self.open_decode_btn.clicked.connect(lambda: self.decode_file())
         control_layout.addWidget(self.open_decode_btn)
 
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.cancel_job)
+        self.cancel_btn.setEnabled(False)
+        control_layout.addWidget(self.cancel_btn)
+
         self.play_btn = QPushButton("Play")
         self.play_btn.clicked.connect(self.toggle_playback)
         control_layout.addWidget(self.play_btn)
 
+        self.heatmap_check = QCheckBox("Heatmap")
+        self.heatmap_check.setToolTip("Highlight the pixels that have been played")
+        self.heatmap_check.toggled.connect(self.set_heatmap_enabled)
+        control_layout.addWidget(self.heatmap_check)
+
         self.save_btn = QPushButton("Save Output")
         self.save_btn.clicked.connect(self.save_output)
         self.save_btn.setEnabled(False)
         control_layout.addWidget(self.save_btn)
 
+        self.export_settings_btn = QPushButton("Export Settings")
+        self.export_settings_btn.clicked.connect(self.show_export_settings)
+        control_layout.addWidget(self.export_settings_btn)
+
         main_layout.addLayout(control_layout)
 
         # **Drag and Drop Prompt**
@@ -407,8 +712,6 @@ class AudioToImageConverter(QMainWindow):
         selected_text = self.method_combo.currentText()  # Get full selected text
         self.encoding_method = method_map.get(selected_text, "A")  # Extract mapped value
 
-        print(f"Encoding Method changed to {self.encoding_method}")  # Debugging
-
         # Reprocess stored file if available.
         if self.last_operation == 'encode' and self.last_audio_file:
             self.encode_file(use_last=True)
@@ -417,111 +720,258 @@ class AudioToImageConverter(QMainWindow):
 
 
     def encode_file(self, use_last=False, file_path=None):
-        try:
-            if file_path is not None:
-                self.last_audio_file = file_path
-                self.last_operation = 'encode'
-            elif not use_last:
-                file_path, _ = QFileDialog.getOpenFileName(
-                    self, "Open Audio File", "",
-                    "Audio Files (*.wav *.mp3 *.ogg *.flac)"
-                )
-                if not file_path:
-                    return
-                self.last_audio_file = file_path
-                self.last_operation = 'encode'
-            elif use_last:
-                file_path = self.last_audio_file
+        if file_path is not None:
+            self.last_audio_file = file_path
+            self.last_operation = 'encode'
+        elif not use_last:
+            file_path, _ = QFileDialog.getOpenFileName(
+                self, "Open Audio File", "",
+                "Audio Files (*.wav *.mp3 *.ogg *.flac)"
+            )
+            if not file_path:
+                return
+            self.last_audio_file = file_path
+            self.last_operation = 'encode'
+        elif use_last:
+            file_path = self.last_audio_file
 
-            if file_path:
-                self.encoded_image = self.encode_audio_to_image(file_path)
-                if self.encoded_image is not None:
-                    self.display_preview(self.encoded_image)
-                    self.output_type = 'image'
-                    self.save_btn.setEnabled(True)
-                    QMessageBox.information(self, "Success", "Encoding completed successfully!")
-                    
-                    # Auto-decode for playback
-                    self.decoded_audio = self.decode_image_to_audio(self.encoded_image)
-                    if self.decoded_audio is not None:
-                        self.load_audio_for_playback()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Encoding failed: {str(e)}")
+        if file_path:
+            self.start_job("Encoding", partial(jobs.encode_audio_file, file_path, self.encoding_method,
+                                   cache=self.job_cache()),
+                           self.on_encode_finished)
 
     def decode_file(self, use_last=False, file_path=None):
-        try:
-            if file_path is not None:
-                self.last_image_file = file_path
-                self.last_operation = 'decode'
-            elif not use_last:
-                file_path, _ = QFileDialog.getOpenFileName(
-                    self, "Open Image File", "",
-                    "Image Files (*.png *.jpg *.jpeg)"
-                )
-                if not file_path:
-                    return
-                self.last_image_file = file_path
-                self.last_operation = 'decode'
-            elif use_last:
-                file_path = self.last_image_file
-
-            if file_path:
-                self.decoded_audio = self.decode_image_to_audio(file_path)
-                if self.decoded_audio is not None:
-                    self.load_audio_for_playback()
-                    self.display_preview(file_path)
-                    self.output_type = 'audio'
-                    self.save_btn.setEnabled(True)
-                    QMessageBox.information(self, "Success", "Decoding completed successfully!")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Decoding failed: {str(e)}")
+        if file_path is not None:
+            self.last_image_file = file_path
+            self.last_operation = 'decode'
+        elif not use_last:
+            file_path, _ = QFileDialog.getOpenFileName(
+                self, "Open Image File", "",
+                "Image Files (*.png *.jpg *.jpeg *.omniraw)"
+            )
+            if not file_path:
+                return
+            self.last_image_file = file_path
+            self.last_operation = 'decode'
+        elif use_last:
+            file_path = self.last_image_file
+
+        if file_path:
+            max_samples = self.photo_limit_spin.value() * codec.SAMPLE_RATE or None
+            self.start_job("Decoding", partial(jobs.open_image, file_path, self.encoding_method,
+                                   cache=self.job_cache(), max_samples=max_samples),
+                           self.on_decode_finished)
+
+    def job_cache(self):
+        if self.result_cache is None:
+            self.result_cache = cache.ResultCache()
+        return self.result_cache
+
+    def start_job(self, title, job, on_finished):
+        """
+        Runs `job(progress=...)` on the thread pool. A newer job cancels the one
+        still running; results of cancelled jobs are dropped.
+        """
+        if self.current_worker is not None:
+            self.current_worker.cancel()
+        worker = CodecWorker(job)
+        worker.signals.progress.connect(partial(self.on_job_progress, worker, title))
+        worker.signals.finished.connect(partial(self.on_job_finished, worker, title, on_finished))
+        worker.signals.failed.connect(partial(self.on_job_failed, worker, title))
+        worker.signals.cancelled.connect(partial(self.on_job_cancelled, worker))
+        self.running_workers.add(worker)  # Keeps the Python wrapper alive while the pool runs it
+        self.current_worker = worker
+        self.cancel_btn.setEnabled(True)
+        self.info_label.setText(f"{title}...")
+        QThreadPool.globalInstance().start(worker)
+
+    def cancel_job(self):
+        if self.current_worker is not None:
+            self.current_worker.cancel()
+            self.info_label.setText("Cancelling...")
+
+    def _end_job(self, worker):
+        self.running_workers.discard(worker)
+        if worker is not self.current_worker:
+            return False
+        self.current_worker = None
+        self.cancel_btn.setEnabled(False)
+        return True
+
+    def on_job_progress(self, worker, title, stage, percent):
+        if worker is self.current_worker:
+            detail = f" {percent}%" if percent >= 0 else ""
+            self.info_label.setText(f"{title}: {stage}{detail}")
+
+    def on_job_finished(self, worker, title, on_finished, result):
+        if self._end_job(worker):
+            self.info_label.setText("Ready")
+            on_finished(result)
+
+    def on_job_failed(self, worker, title, message):
+        if self._end_job(worker):
+            self.info_label.setText("Ready")
+            QMessageBox.critical(self, "Error", f"{title} failed: {message}")
+
+    def on_job_cancelled(self, worker):
+        if self._end_job(worker):
+            self.info_label.setText("Cancelled")
+
+    def on_encode_finished(self, result):
+        if self.is_playing:
+            self.stop_playback()
+        self.encoded_image = result.rgb
+        # Written into saved PNGs and raw headers so decoding needn't guess
+        self.encoded_info = codec.ImageInfo(result.method, result.sample_count)
+        self.display_preview(self.encoded_image)
+        self.image_source = jobs.ImageResult(result.rgb, result.method, result.sample_count)
+        self.output_type = 'image'
+        self.save_btn.setEnabled(True)
+        QMessageBox.information(self, "Success", "Encoding completed successfully!")
+
+        # The encoder already rebuilt the lossy PCM, so playback needs no decode pass
+        self.restore_playback = partial(self.load_audio_for_playback, result.playback, result.method,
+                                        result.rgb.shape)
+        self.restore_playback()
+
+    def on_decode_finished(self, result):
+        if self.is_playing:
+            self.stop_playback()
+        self.source_rgb = result.rgb  # Kept so the preview doesn't decode the file again
+        if result.sample_count is not None:
+            # The image named its own method; show it without triggering a re-decode
+            self.method_combo.blockSignals(True)
+            self.method_combo.setCurrentIndex(codec.METHODS.index(result.method))
+            self.method_combo.blockSignals(False)
+            self.encoding_method = result.method
+        self.display_preview(self.source_rgb)
+        if isinstance(result, jobs.DecodeResult):
+            # A photo over the length limit, already shrunk and resampled to fit
+            self.decoded_blocks = partial(iter, (result.pcm,))
+            self.image_source = jobs.ImageResult(result.rgb, result.method, None)
+            self.restore_playback = partial(self.play_sonified, result)
+        else:
+            self.decoded_blocks = partial(codec.decode_blocks, result.rgb, result.method, result.sample_count)
+            self.image_source = result
+            self.restore_playback = partial(self.play_image, result)
+        self.restore_playback()
+        self.output_type = 'audio'
+        self.save_btn.setEnabled(True)
+        QMessageBox.information(self, "Success", "Decoding completed successfully!")
 
     def save_output(self):
-        if self.output_type == 'image' and self.encoded_image is not None:
-            file_path, _ = QFileDialog.getSaveFileName(
+        if self.selection_audio is not None:
+            self.export_selection()
+        elif self.output_type == 'image' and self.encoded_image is not None:
+            file_path, selected_filter = QFileDialog.getSaveFileName(
                 self, "Save Image", "",
-                "PNG Files (*.png)"
+                "PNG Files (*.png);;Omnigraph Raw (*.omniraw)"
             )
             if file_path:
-                self.encoded_image.save(file_path, "PNG")
+                if rawimage.is_raw_path(file_path) or selected_filter.startswith("Omnigraph Raw"):
+                    if not rawimage.is_raw_path(file_path):
+                        file_path += rawimage.RAW_EXTENSION
+                    rawimage.save_raw(file_path, self.encoded_image, self.encoded_info.method,
+                                      self.encoded_info.sample_count)
+                else:
+                    rgb_array = self.encoded_image
+                    settings = self.png_settings or images.DEFAULT_PNG
+                    if rgb_array.shape[0] * rgb_array.shape[1] >= images.BACKGROUND_EXPORT_PIXELS:
+                        # Large PNGs compress on the writer thread; on_export_finished reports back
+                        self.info_label.setText("Saving image...")
+                        if self.png_writer is None:
+                            self.png_writer = images.BackgroundWriter()
+                        future = self.png_writer.submit(rgb_array, file_path, settings, self.encoded_info)
+                        future.add_done_callback(
+                            lambda done, path=file_path: self.export_finished.emit(
+                                path, str(done.exception() or "")))
+                        return
+                    images.save_png(rgb_array, file_path, settings, self.encoded_info)
                 QMessageBox.information(self, "Success", f"Image saved to {file_path}")
-        elif self.output_type == 'audio' and self.decoded_audio is not None:
+        elif self.output_type == 'audio' and self.decoded_blocks is not None:
             file_path, _ = QFileDialog.getSaveFileName(
                 self, "Save Audio", "",
                 "WAV Files (*.wav)"
             )
             if file_path:
-                with open(file_path, 'wb') as f:
-                    f.write(self.decoded_audio.getvalue())
+                pcm.write_wav_blocks(file_path, self.decoded_blocks())
                 QMessageBox.information(self, "Success", f"Audio saved to {file_path}")
 
+    def export_selection(self):
+        """ Saves the selected slice as WAV, or its pixels as a plain PNG crop. """
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Save Selection", "",
+            "WAV Files (*.wav);;PNG Files (*.png)"
+        )
+        if not file_path:
+            return
+        if file_path.lower().endswith('.png') or selected_filter.startswith("PNG"):
+            if not file_path.lower().endswith('.png'):
+                file_path += '.png'
+            top, left, height, width = self.selection
+            crop = self.image_source.rgb[top:top + height, left:left + width]
+            images.save_png(crop, file_path, self.png_settings or images.DEFAULT_PNG)
+        else:
+            pcm.write_wav(file_path, self.selection_audio)
+        QMessageBox.information(self, "Success", f"Selection saved to {file_path}")
+
+    def on_export_finished(self, file_path, error):
+        self.info_label.setText("Ready")
+        if error:
+            QMessageBox.critical(self, "Error", f"Saving {file_path} failed: {error}")
+        else:
+            QMessageBox.information(self, "Success", f"Image saved to {file_path}")
+
+    def on_stage_finished(self, record):
+        message = f"{record['stage']}: {record['wall_s']:.3f} s ({record['cpu_s']:.3f} s CPU"
+        if record.get("bytes"):
+            message += f", {record['bytes'] / 1e6:.1f} MB"
+        if "peak_bytes" in record:
+            message += f", peak {record['peak_bytes'] / 1e6:.1f} MB"
+        self.statusBar().showMessage(message + ")")
+
+    def show_export_settings(self):
+        dialog = ExportSettingsDialog(self.png_settings or images.DEFAULT_PNG, self)
+        if dialog.exec_() == QDialog.Accepted:
+            self.png_settings = dialog.settings()
+
     def display_preview(self, image_data):
         self.scene.clear()
-        if isinstance(image_data, Image.Image):
-            byte_arr = io.BytesIO()
-            image_data.save(byte_arr, format='PNG')
-            pixmap = QPixmap()
-            pixmap.loadFromData(byte_arr.getvalue())
-        else:
-            pixmap = QPixmap(image_data)
-        self.scene.addPixmap(pixmap)
-        self.graphics_view.fitInView(QRectF(pixmap.rect()), Qt.KeepAspectRatio)
-        self.image_size = (pixmap.width(), pixmap.height())
+        self.selection = self.selection_audio = self.selection_item = None
+        if isinstance(image_data, str) and rawimage.is_raw_path(image_data):
+            _, image_data = rawimage.open_raw(image_data)
+        elif isinstance(image_data, str):
+            image_data = images.load_rgb(image_data)
+        with profiling.stage("preview_build") as record:
+            # Tiled so that zooming and panning only ever touch the visible tiles
+            preview = TiledPreviewItem(image_data)
+            self.scene.addItem(preview)
+            self.scene.setSceneRect(preview.boundingRect())
+            self.graphics_view.fitInView(preview.boundingRect(), Qt.KeepAspectRatio)
+            record["bytes"] = image_data.nbytes
+        self.image_size = (preview.pyramid.width, preview.pyramid.height)
         self.viz_rect = self.scene.addRect(0, 0, self.cursor_size, self.cursor_size,
                                            brush=QBrush(QColor(255, 0, 0, 200)))
+        self.viz_rect.setZValue(2)
         self.viz_rect.setVisible(True)
+        self.cursor_location = None
+        self.heatmap = None
+        if self.heatmap_check.isChecked():
+            self.set_heatmap_enabled(True)
 
     def slider_released(self):
         self.dragging_slider = False
-        if self.audio_data:
+        if self.has_audio():
             new_pos = self.progress_slider.value()
-            self.current_position = new_pos
             if self.is_playing:
                 self.stop_playback()
+                self.playback_source.seek(new_pos)
                 self.start_playback()
+            else:
+                self.playback_source.seek(new_pos)
 
     def toggle_playback(self):
-        if not hasattr(self, 'audio_data') or not self.audio_data:
+        if not self.has_audio():
             QMessageBox.warning(self, "Playback", "No audio loaded or audio is empty!")
             return
 
@@ -531,29 +981,32 @@ class AudioToImageConverter(QMainWindow):
             self.start_playback()
 
 
+    def audio_device(self):
+        """ The PyAudio instance, started on first use; None if PortAudio failed. """
+        if self.p is None:
+            try:
+                import pyaudio
+                self.p = pyaudio.PyAudio()
+            except Exception as e:
+                QMessageBox.critical(self, "Audio Error", f"Failed to initialize audio: {str(e)}")
+        return self.p
+
     def start_playback(self):
-        if not hasattr(self, 'p') or self.p is None:
-            QMessageBox.critical(self, "Playback Error", "Audio system is not initialized.")
+        if self.audio_device() is None:
             return
 
         try:
-            self.stream = self.p.open(
-                format=self.p.get_format_from_width(2),
-                channels=1,
-                rate=44100,
-                output=True,
-                stream_callback=self.audio_callback
-            )
-            
-            if self.stream is None:
-                QMessageBox.critical(self, "Playback Error", "Failed to create audio stream.")
-                return
+            if self.playback_source.finished:
+                self.playback_source.seek(0)
+            self.player = playback.Player(self.p, self.playback_source)
+            self.player.start()
 
             self.is_playing = True
             self.play_btn.setText("Pause")
             self.viz_rect.setVisible(True)
             self.timer.start(50)  # Ensure timer is running
         except Exception as e:
+            self.player = None
             QMessageBox.critical(self, "Playback Error", f"Failed to start playback: {str(e)}")
 
     def stop_playback(self):
@@ -563,245 +1016,138 @@ class AudioToImageConverter(QMainWindow):
         self.is_playing = False
         self.play_btn.setText("Play")
 
-        if hasattr(self, 'stream') and self.stream:
-            self.stream.stop_stream()
-            self.stream.close()
-            self.stream = None  # Set to None to prevent invalid access
-
-    def audio_callback(self, in_data, frame_count, time_info, status):
-        try:
-            # Debugging: Check if audio data exists
-            if not hasattr(self, 'audio_data') or self.audio_data is None:
-                print("[DEBUG] No audio data loaded. Returning silence.")
-                return (b'\x00' * frame_count * 2, pyaudio.paComplete)  # Return silence
-            
-            total_samples = len(self.audio_data) // 2  # Convert byte count to sample count
-            start = self.current_position
-            end = min(start + frame_count, total_samples)  # Prevent index out-of-bounds
-            
-            # Debugging: Print frame positions
-            print(f"[DEBUG] Playing from {start} to {end} / {total_samples}")
-
-            if start >= total_samples:
-                print("[DEBUG] Playback finished. Returning silence.")
-                return (b'\x00' * frame_count * 2, pyaudio.paComplete)  # Stop playback safely
-
-            data = self.audio_data[start * 2:end * 2]  # Extract correct audio segment
-            self.current_position = end
-
-            return (data, pyaudio.paContinue if end < total_samples else pyaudio.paComplete)
-
-        except Exception as e:
-            print(f"[ERROR] Audio callback failed: {e}")
-            return (b'\x00' * frame_count * 2, pyaudio.paAbort)  # Abort playback if an error occurs
-
+        if self.player is not None:
+            self.player.stop()
+            self.player = None
+        if self.playback_source is not None and self.playback_source.underruns:
+            self.info_label.setText(f"Playback underruns: {self.playback_source.underruns}")
 
     def update_visualizer(self):
-        if not self.audio_data or self.image_size[0] == 0:
+        if not self.has_audio() or self.image_size[0] == 0:
             return
 
-        if not self.dragging_slider:
-            self.progress_slider.setValue(self.current_position)
-
-        total_samples = len(self.audio_data) // 2  # Convert byte count to sample count
+        if self.player is not None and not self.player.active:
+            self.stop_playback()  # Reached the end
 
-        if self.encoding_method == "A":
-            # A should go through the whole image once per channel
-            samples_per_channel = total_samples // 3  # Divide equally among R, G, B
-            channel_index = self.current_position // samples_per_channel  # Determines which channel we are in
-            channel_position = self.current_position % samples_per_channel  # Position within the current channel
-            
-            # Map position to pixel space
-            current_pixel = channel_position
-            row = current_pixel // self.image_size[0]
-            col = current_pixel % self.image_size[0]
-
-            # Set visualizer box color based on the channel
-            if channel_index == 0:  # Red Channel
-                box_color = QColor(255, 0, 0, 200)  # Red
-            elif channel_index == 1:  # Green Channel
-                box_color = QColor(0, 255, 0, 200)  # Green
-            else:  # Blue Channel
-                box_color = QColor(0, 0, 255, 200)  # Blue
-
-            if row < self.image_size[1]:
-                self.viz_rect.setPos(col - self.cursor_size // 2, row - self.cursor_size // 2)
-                self.viz_rect.setBrush(QBrush(box_color))  # Change color dynamically
-
-        elif self.encoding_method == "B":
-            # B should go through the whole image only once, but slower (since it processes R, G, B sequentially per pixel)
-            total_pixels = self.image_size[0] * self.image_size[1]  # Total number of pixels
-            total_steps = total_pixels * 3  # Since it processes R, G, B separately per pixel
-
-            # Map current position to pixel space
-            pixel_index = self.current_position // 3  # Divide by 3 to slow down movement
-            row = pixel_index // self.image_size[0]
-            col = pixel_index % self.image_size[0]
-
-            if row < self.image_size[1]:
-                self.viz_rect.setPos(col - self.cursor_size // 2, row - self.cursor_size // 2)
-                self.viz_rect.setBrush(QBrush(QColor(0, 0, 0, 200)))  # Always black for B
-
-
-        elif self.encoding_method == "C":
-            # C is already correct, goes through the whole image once
-            current_pixel = self.current_position
-            row = current_pixel // self.image_size[0]
-            col = current_pixel % self.image_size[0]
-
-            if row < self.image_size[1]:
-                self.viz_rect.setPos(col - self.cursor_size // 2, row - self.cursor_size // 2)
-                self.viz_rect.setBrush(QBrush(QColor(0, 0, 0, 200)))  # Always black for C
-
-
-
-
-    def encode_audio_to_image(self, audio_path):
-        temp_wav = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-        temp_wav.close()
-        try:
-            subprocess.run([
-                "ffmpeg", "-y", "-i", audio_path,
-                "-ac", "1", "-ar", "44100", "-c:a", "pcm_s16le",
-                "-hide_banner", "-loglevel", "error", temp_wav.name
-            ], check=True, stderr=subprocess.PIPE)
-            with wave.open(temp_wav.name, 'rb') as wav_file:
-                raw_data = wav_file.readframes(wav_file.getnframes())
-            audio_data = np.frombuffer(raw_data, dtype=np.int16)
-            audio_8bit = ((audio_data.astype(np.float32) + 32768) / 65535 * 255).astype(np.uint8)
-            if self.encoding_method == "A":
-                total = len(audio_8bit)
-                split_points = [total // 3, 2 * total // 3]
-                red = audio_8bit[:split_points[0]]
-                green = audio_8bit[split_points[0]:split_points[1]]
-                blue = audio_8bit[split_points[1]:]
-                side = int(np.ceil(np.sqrt(len(red))))
-                required = side ** 2
-                red = np.pad(red, (0, required - len(red)), mode='constant')
-                green = np.pad(green, (0, required - len(green)), mode='constant')
-                blue = np.pad(blue, (0, required - len(blue)), mode='constant')
-                rgb_array = np.zeros((side, side, 3), dtype=np.uint8)
-                rgb_array[:, :, 0] = red.reshape((side, side))
-                rgb_array[:, :, 1] = green.reshape((side, side))
-                rgb_array[:, :, 2] = blue.reshape((side, side))
-            elif self.encoding_method == "B":
-                audio_8bit = audio_8bit[:len(audio_8bit) - (len(audio_8bit) % 3)]
-                audio_8bit = audio_8bit.reshape(-1, 3)
-                side = int(np.ceil(np.sqrt(len(audio_8bit))))
-                required = side ** 2
-                audio_8bit = np.pad(audio_8bit, ((0, required - len(audio_8bit)), (0, 0)), mode='constant')
-                rgb_array = np.zeros((side, side, 3), dtype=np.uint8)
-                rgb_array[:, :, 0] = audio_8bit[:, 0].reshape((side, side))
-                rgb_array[:, :, 1] = audio_8bit[:, 2].reshape((side, side))
-                rgb_array[:, :, 2] = audio_8bit[:, 1].reshape((side, side))
-            elif self.encoding_method == "C":
-                audio_float = audio_data.astype(np.float32) / 32768.0
-                N = len(audio_float)
-                Fs = 44100
-                fft_data = np.fft.rfft(audio_float)
-                low_cutoff = 1000
-                mid_cutoff = 4000
-                k_low = int(low_cutoff * N / Fs)
-                k_mid = int(mid_cutoff * N / Fs)
-                low_fft = fft_data.copy()
-                low_fft[k_low:] = 0.0
-                mid_fft = fft_data.copy()
-                mid_fft[:k_low] = 0.0
-                mid_fft[k_mid:] = 0.0
-                high_fft = fft_data.copy()
-                high_fft[:k_mid] = 0.0
-                low_signal = np.fft.irfft(low_fft, n=N)
-                mid_signal = np.fft.irfft(mid_fft, n=N)
-                high_signal = np.fft.irfft(high_fft, n=N)
-                def to_8bit(signal):
-                    signal = (signal * 32768).astype(np.int16)
-                    return ((signal.astype(np.float32) + 32768) / 65535 * 255).astype(np.uint8)
-                low_8bit = to_8bit(low_signal)
-                mid_8bit = to_8bit(mid_signal)
-                high_8bit = to_8bit(high_signal)
-                side = int(np.ceil(np.sqrt(N)))
-                required = side ** 2
-                red = np.pad(low_8bit, (0, required - N), mode='constant')
-                green = np.pad(mid_8bit, (0, required - N), mode='constant')
-                blue = np.pad(high_8bit, (0, required - N), mode='constant')
-                rgb_array = np.zeros((side, side, 3), dtype=np.uint8)
-                rgb_array[:, :, 0] = red.reshape((side, side))
-                rgb_array[:, :, 1] = green.reshape((side, side))
-                rgb_array[:, :, 2] = blue.reshape((side, side))
-            img = Image.fromarray(rgb_array, 'RGB')
-            return img
-        except subprocess.CalledProcessError as e:
-            QMessageBox.critical(self, "Encoding Error", f"FFmpeg failed: {e.stderr.decode()}")
-            return None
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Encoding failed: {str(e)}")
-            return None
-        finally:
-            os.remove(temp_wav.name)
-
-    def decode_image_to_audio(self, image_input):
-        try:
-            if isinstance(image_input, str):
-                img = Image.open(image_input)
+        # Written by the audio thread; read once per tick
+        position = self.playback_source.position
+        if position == self.last_position:
+            return
+        if not self.dragging_slider:
+            self.progress_slider.setValue(position)
+
+        pixel, channel = (int(value) for value in self.locate_sample(position))
+        if self.playback_method != "A":
+            channel = -1  # Method A colours the cursor by the plane being played; B and C use black
+        if self.heatmap is not None:
+            previous = self.last_position
+            if previous is not None and 0 < position - previous <= codec.SAMPLE_RATE:
+                self.heatmap.mark(self.locate_sample(np.arange(previous, position))[0])
             else:
-                img = image_input
-            img = img.convert("RGB")
-            rgb_array = np.array(img)
-
-            if self.encoding_method == "A":
-                # Extract channel data in correct sequence
-                red_channel = rgb_array[:, :, 0].flatten()  # First 1/3rd of audio
-                green_channel = rgb_array[:, :, 1].flatten()  # Second 1/3rd
-                blue_channel = rgb_array[:, :, 2].flatten()  # Last 1/3rd
-                
-                # Ensure we reconstruct the original encoded sequence (not repeating)
-                reconstructed_audio = np.concatenate([red_channel, green_channel, blue_channel])
-
-                # Convert back to 16-bit audio
-                audio_16bit = ((reconstructed_audio.astype(np.float32) / 255) * 65535 - 32768).astype(np.int16)
-
-            elif self.encoding_method == "B":
-                red = rgb_array[:, :, 0].flatten()
-                blue = rgb_array[:, :, 2].flatten()
-                green = rgb_array[:, :, 1].flatten()
-                audio_8bit = np.stack([red, blue, green], axis=-1).flatten()
-                audio_16bit = ((audio_8bit.astype(np.float32) / 255) * 65535 - 32768).astype(np.int16)
-
-            elif self.encoding_method == "C":
-                red = rgb_array[:, :, 0].flatten()
-                green = rgb_array[:, :, 1].flatten()
-                blue = rgb_array[:, :, 2].flatten()
-                red_16 = ((red.astype(np.float32) / 255) * 65535 - 32768).astype(np.int16)
-                green_16 = ((green.astype(np.float32) / 255) * 65535 - 32768).astype(np.int16)
-                blue_16 = ((blue.astype(np.float32) / 255) * 65535 - 32768).astype(np.int16)
-                audio_16bit = (red_16 * 0.6 + green_16 * 0.3 + blue_16 * 0.1).astype(np.int16)
-
-            # Save and return decoded audio
-            audio_buffer = io.BytesIO()
-            with wave.open(audio_buffer, 'wb') as wav_file:
-                wav_file.setnchannels(1)
-                wav_file.setsampwidth(2)
-                wav_file.setframerate(44100)
-                wav_file.writeframes(audio_16bit.tobytes())
-            audio_buffer.seek(0)
-            return audio_buffer
-
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Decoding failed: {str(e)}")
-            return None
+                self.heatmap.mark([pixel])  # Seeked: only the new position
+        self.last_position = position
 
+        # Only touch the scene when the cursor lands on another pixel
+        if (pixel, channel) == self.cursor_location:
+            return
+        row, col = divmod(pixel, self.image_size[0])
+        self.viz_rect.setPos(col - self.cursor_size // 2, row - self.cursor_size // 2)
+        if self.cursor_location is None or channel != self.cursor_location[1]:
+            self.viz_rect.setBrush(QBrush(CHANNEL_COLORS.get(channel, QColor(0, 0, 0, 200))))
+        self.cursor_location = (pixel, channel)
+
+    def set_heatmap_enabled(self, enabled):
+        if self.heatmap is not None:
+            self.scene.removeItem(self.heatmap)
+            self.heatmap = None
+        if enabled and self.image_size[0]:
+            self.heatmap = PlaybackHeatmap(*self.image_size)
+            self.heatmap.setZValue(1)
+            self.scene.addItem(self.heatmap)
+
+    def load_audio_for_playback(self, audio_16bit, method, shape):
+        """ Plays straight from the int16 array; WAV wrapping only happens on save. """
+        self.set_playback_source(playback.PlaybackSource(audio_16bit), method,
+                                 partial(codec.sample_locations, method=method, shape=shape,
+                                         sample_count=len(audio_16bit)))
+
+    def play_image(self, image):
+        """ Plays a jobs.ImageResult, decoded block by block so nothing waits on a full decode. """
+        self.set_playback_source(playback.ImageSource(image.rgb, image.method, image.sample_count),
+                                 image.method,
+                                 partial(codec.sample_locations, method=image.method, shape=image.rgb.shape,
+                                         sample_count=image.sample_count))
+
+    def play_sonified(self, result):
+        """ Plays a resampled photo; positions are scaled back onto the shrunk pixels. """
+        shape = result.rgb.shape
+        scale = codec.decoded_length(shape, result.method) / max(1, len(result.pcm))
+        self.set_playback_source(playback.PlaybackSource(result.pcm), result.method,
+                                 lambda positions: codec.sample_locations(
+                                     np.asarray(positions) * scale, result.method, shape))
+
+    def set_playback_source(self, source, method, locate_sample):
+        if self.playback_source is not None:
+            self.playback_source.close()
+        self.playback_source = source
+        self.playback_method = codec.normalize_method(method)
+        self.locate_sample = locate_sample
+        self.last_position = None
+        self.progress_slider.setMaximum(source.total)
+
+    def select_region(self, rect):
+        """ Decodes just the pixels under a Shift+drag rectangle and plays them. """
+        if self.image_source is None:
+            return
+        rect = rect.intersected(QRectF(0, 0, *self.image_size))
+        if rect.width() < 1 or rect.height() < 1:
+            self.clear_selection()  # Shift+click (or a band outside the image) clears
+            return
+        image = self.image_source
+        top, left = int(rect.top()), int(rect.left())
+        height, width = int(rect.bottom() + 0.5) - top, int(rect.right() + 0.5) - left
+        audio_16bit = codec.decode_region(image.rgb, image.method, top, left, height, width, image.sample_count)
+        if not len(audio_16bit):
+            self.info_label.setText("The selection only covers padding")
+            return
 
+        if self.is_playing:
+            self.stop_playback()
+        if self.selection_item is not None:
+            self.scene.removeItem(self.selection_item)
+        self.selection = (top, left, height, width)
+        self.selection_audio = audio_16bit
+        self.selection_item = self.scene.addRect(QRectF(left, top, width, height),
+                                                 QPen(QColor(38, 255, 126), 0), QBrush(QColor(38, 255, 126, 40)))
+        self.selection_item.setZValue(3)
+        pixels, channels = codec.region_locations(image.rgb.shape, image.method, top, left, height, width,
+                                                  image.sample_count)
+        self.set_playback_source(playback.PlaybackSource(audio_16bit), image.method,
+                                 partial(locate_in_region, pixels, channels))
+        self.save_btn.setEnabled(True)
+        self.info_label.setText(f"Selection {width} x {height} px, "
+                                f"{len(audio_16bit) / codec.SAMPLE_RATE:.2f} s (Esc clears)")
+        self.start_playback()
+
+    def clear_selection(self):
+        if self.selection is None:
+            return
+        if self.is_playing:
+            self.stop_playback()
+        self.scene.removeItem(self.selection_item)
+        self.selection = self.selection_audio = self.selection_item = None
+        self.info_label.setText("Ready")
+        if self.restore_playback is not None:
+            self.restore_playback()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Escape and self.selection is not None:
+            self.clear_selection()
+        else:
+            super().keyPressEvent(event)
 
-    def load_audio_for_playback(self):
-        if self.decoded_audio:
-            try:
-                self.decoded_audio.seek(0)
-                with wave.open(self.decoded_audio, 'rb') as wav_file:
-                    self.audio_data = wav_file.readframes(wav_file.getnframes())
-                self.progress_slider.setMaximum(len(self.audio_data) // 2)
-                self.current_position = 0
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to load audio: {str(e)}")
+    def has_audio(self):
+        return self.playback_source is not None and self.playback_source.total > 0
 
     # --- Drag and Drop events on the main window (near the buttons) ---
     def dragEnterEvent(self, event):
@@ -812,7 +1158,7 @@ class AudioToImageConverter(QMainWindow):
         urls = event.mimeData().urls()
         if urls:
             file_path = urls[0].toLocalFile()
-            if file_path.lower().endswith(('.png', '.jpg', '.jpeg')):
+            if file_path.lower().endswith(('.png', '.jpg', '.jpeg', rawimage.RAW_EXTENSION)):
                 self.decode_file(file_path=file_path)
             elif file_path.lower().endswith(('.wav', '.mp3', '.ogg', '.flac')):
                 self.encode_file(file_path=file_path)
@@ -823,17 +1169,29 @@ class AudioToImageConverter(QMainWindow):
         """ Ensure all resources are cleaned up properly before closing the app. """
         try:
             # Stop playback properly
-            if hasattr(self, 'stream') and self.stream is not None:
-                self.stream.stop_stream()
-                self.stream.close()
+            if self.player is not None:
+                self.player.stop()
+                self.player = None
+
+            # Abandon any encode/decode still running
+            if self.current_worker is not None:
+                self.current_worker.cancel()
+
+            # Let queued PNG exports finish writing
+            if self.png_writer is not None:
+                self.png_writer.shutdown(wait=True)
+            if self.profile_listener is not None:
+                profiling.remove_listener(self.profile_listener)
 
             # Terminate PyAudio safely
-            if hasattr(self, 'p') and self.p is not None:
+            if self.p is not None:
                 self.p.terminate()
             
             # Clear buffers (helps if large memory is allocated)
-            if hasattr(self, 'audio_data'):
-                del self.audio_data
+            if self.playback_source is not None:
+                self.playback_source.close()
+                self.playback_source = None
+            self.decoded_blocks = None
 
             # Stop visualizer timer if running
             if hasattr(self, 'timer') and self.timer.isActive():
@@ -849,6 +1207,12 @@ class AudioToImageConverter(QMainWindow):
 
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # Batch workers re-enter here in the PyInstaller build
+    if len(sys.argv) > 1 and sys.argv[1] in ("encode", "decode", "serve"):
+        from omnigraph.cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+
     app = QApplication(sys.argv)
     try:
         window = AudioToImageConverter()
@@ -6,7 +6,8 @@ a = Analysis(
     pathex=[],
     binaries=[('Resources\\ffmpeg\\ffmpeg-7.1-essentials_build\\bin\\ffmpeg.exe', 'Resources\\ffmpeg')],
     datas=[('Resources\\text_background.png', 'Resources'), ('Resources\\Logo_Omnigraph.png', 'Resources'), ('Resources\\Logo_Omnigraph.ico', 'Resources')],
-    hiddenimports=[],
+    hiddenimports=['numpy', 'omnigraph.cache', 'omnigraph.codec', 'omnigraph.images', 'omnigraph.jobs',
+                   'omnigraph.pcm', 'omnigraph.playback', 'omnigraph.pyramid', 'omnigraph.rawimage'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=['set_ffmpeg_path.py'],
@@ -0,0 +1,134 @@
+"""
+Regression tests for the Method A/B/C codec: encode must stay bit-identical to
+the original per-sample formulas, and decode must undo it for every method.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from omnigraph import codec  # noqa: E402
+from omnigraph.codec import CodecError, ImageInfo  # noqa: E402
+
+LENGTHS = (1, 2, 3, 4, 5, 10, 299, 300, 301, 1000, 4097)
+# Method B drops the samples after the last full pixel; below three nothing is left to round-trip
+B_LENGTHS = tuple(length for length in LENGTHS if length >= 3)
+
+
+def reference_quantize(pcm):
+    return ((pcm.astype(np.float32) + 32768) / 65535 * 255).astype(np.uint8)
+
+
+def reference_dequantize(values):
+    return ((values.astype(np.float32) / 255) * 65535 - 32768).astype(np.int16)
+
+
+def reference_encode_a(pcm):
+    """
+    Method A as the app first shipped it: thirds of the audio in R, G and B.
+    The side comes from the blue plane, the longest; the original sized the
+    image for red and failed whenever blue didn't fit, and is identical otherwise.
+    """
+    audio_8bit = reference_quantize(pcm)
+    split_points = [len(audio_8bit) // 3, 2 * len(audio_8bit) // 3]
+    planes = np.split(audio_8bit, split_points)
+    side = int(np.ceil(np.sqrt(len(planes[2]))))
+    rgb_array = np.zeros((side, side, 3), dtype=np.uint8)
+    for channel, plane in enumerate(planes):
+        rgb_array[:, :, channel] = np.pad(plane, (0, side * side - len(plane))).reshape(side, side)
+    return rgb_array
+
+
+def reference_encode_b(pcm):
+    """ Method B as the app first shipped it: samples interleaved in R, B, G order. """
+    audio_8bit = reference_quantize(pcm)
+    audio_8bit = audio_8bit[:len(audio_8bit) - len(audio_8bit) % 3].reshape(-1, 3)
+    side = int(np.ceil(np.sqrt(len(audio_8bit))))
+    audio_8bit = np.pad(audio_8bit, ((0, side * side - len(audio_8bit)), (0, 0)))
+    rgb_array = np.zeros((side, side, 3), dtype=np.uint8)
+    rgb_array[:, :, 0] = audio_8bit[:, 0].reshape(side, side)
+    rgb_array[:, :, 1] = audio_8bit[:, 2].reshape(side, side)
+    rgb_array[:, :, 2] = audio_8bit[:, 1].reshape(side, side)
+    return rgb_array
+
+
+def reference_decode_c(rgb):
+    red, green, blue = (reference_dequantize(rgb[:, :, channel].reshape(-1)) for channel in range(3))
+    return (red * 0.6 + green * 0.3 + blue * 0.1).astype(np.int16)
+
+
+def noise(length, seed=0):
+    """ Noise that also hits both int16 extremes and zero. """
+    pcm = (np.random.default_rng(seed).standard_normal(length) * 12000).clip(-32768, 32767).astype(np.int16)
+    pcm[:3] = (-32768, 0, 32767)[:length]
+    return pcm
+
+
+def test_quantize_matches_reference_for_every_int16():
+    every = np.arange(-32768, 32768, dtype=np.int64).astype(np.int16)
+    assert np.array_equal(codec.int16_to_uint8(every), reference_quantize(every))
+    every_byte = np.arange(256, dtype=np.uint8)
+    assert np.array_equal(codec.uint8_to_int16(every_byte), reference_dequantize(every_byte))
+
+
+def test_quantize_boundaries_match_mobile_codec():
+    assert codec.int16_to_uint8(np.array([-32768, 0, 32767], dtype=np.int16)).tolist() == [0, 127, 255]
+    assert codec.uint8_to_int16(np.array([0, 127, 255], dtype=np.uint8)).tolist() == [-32768, -129, 32767]
+
+
+@pytest.mark.parametrize("length", LENGTHS)
+@pytest.mark.parametrize("method, reference", [("A", reference_encode_a), ("B", reference_encode_b)])
+def test_encode_matches_baseline(method, reference, length):
+    pcm = noise(length)
+    assert np.array_equal(codec.encode(pcm, method), reference(pcm))
+
+
+@pytest.mark.parametrize("method, length", [("A", length) for length in LENGTHS] +
+                                           [("B", length) for length in B_LENGTHS])
+def test_round_trip(method, length):
+    pcm = noise(length)
+    rgb_array = codec.encode(pcm, method)
+    audio_16bit = codec.decode(rgb_array, method, length)
+    kept = length if method == "A" else length - length % 3
+    assert np.array_equal(audio_16bit, reference_dequantize(reference_quantize(pcm[:kept])))
+    # Quantized audio is a fixed point: encoding the decoded samples gives the same pixels
+    assert np.array_equal(codec.encode(audio_16bit, method), rgb_array)
+
+
+@pytest.mark.parametrize("length", LENGTHS)
+def test_method_c_sample_counts(length):
+    pcm = noise(length)
+    rgb_array = codec.encode(pcm, "C")
+    side = rgb_array.shape[0]
+    assert side == int(np.ceil(np.sqrt(length)))
+    assert len(codec.decode(rgb_array, "C")) == side * side
+    audio_16bit = codec.decode(rgb_array, "C", length)
+    assert len(audio_16bit) == length == codec.decoded_length(rgb_array.shape, "C", length)
+    assert np.array_equal(audio_16bit, reference_decode_c(rgb_array)[:length])
+
+
+@pytest.mark.parametrize("method", ["A", "B", "C"])
+def test_decode_range_pieces_match_decode(method):
+    pcm = noise(1000)
+    rgb_array = codec.encode(pcm, method)
+    whole = codec.decode(rgb_array, method, len(pcm))
+    pieces = [codec.decode_range(rgb_array, method, start, start + 97, len(pcm))
+              for start in range(0, len(whole), 97)]
+    assert np.array_equal(np.concatenate(pieces), whole)
+    assert np.array_equal(np.concatenate(list(codec.decode_blocks(rgb_array, method, len(pcm), 64))), whole)
+
+
+@pytest.mark.parametrize("method", ["A", "B", "C"])
+def test_oversized_sample_count(method):
+    rgb_array = codec.encode(noise(300), method)
+    capacity = rgb_array.shape[0] * rgb_array.shape[1] * (1 if method == "C" else 3)
+    # Decoding an array clamps to what it holds, the same for every method
+    assert len(codec.decode(rgb_array, method, 10 ** 6)) == capacity - (capacity % 3 if method == "B" else 0)
+    with pytest.raises(CodecError):
+        codec.check_info(ImageInfo(method, 10 ** 6), rgb_array.shape[:2])
+    assert codec.check_info(ImageInfo(method, capacity), rgb_array.shape[:2]).sample_count == capacity